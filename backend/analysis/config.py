@@ -51,6 +51,8 @@ class Config:
             "downsample_noise",
             "schema_normalize"
         ]
+        self._probe_priority_index = {name: i for i, name in enumerate(self.probe_priorities)}
+        self._probe_priority_default = len(self.probe_priorities)
         
         # Convergence criteria
         self.convergence = {
@@ -77,10 +79,7 @@ class Config:
     
     def get_probe_priority(self, probe_type: str) -> int:
         """Get priority order for probe type."""
-        try:
-            return self.probe_priorities.index(probe_type)
-        except ValueError:
-            return len(self.probe_priorities)
+        return self._probe_priority_index.get(probe_type, self._probe_priority_default)
     
     def is_converged(self, explains_pct: float, p_value: float) -> bool:
         """Check if investigation has converged."""
@@ -0,0 +1,110 @@
+"""
+SQLite connection pooling for the metrics database.
+Keeps connections open across calls instead of reconnecting per operation.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+class SQLitePool:
+    """Bounded pool of reusable SQLite connections to a single database file."""
+
+    def __init__(self, db_path: str, min_size: int = 2, max_size: int = 10,
+                 connection_timeout: float = 30.0):
+        self.db_path = db_path
+        self.min_size = min_size
+        self.max_size = max_size
+        self.connection_timeout = connection_timeout
+
+        self._idle = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._created = 0
+
+        for _ in range(min_size):
+            self._created += 1
+            self._idle.put(self._create_connection())
+
+    def _create_connection(self) -> sqlite3.Connection:
+        """Open a new connection and apply per-connection pragmas."""
+        # Connections are handed to one thread at a time via the queue,
+        # so sharing them across threads is safe. isolation_level=None disables
+        # implicit transactions; writers use transaction() for explicit ones.
+        conn = sqlite3.connect(
+            self.db_path, timeout=self.connection_timeout, check_same_thread=False,
+            isolation_level=None
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one while under max_size."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_grow = self._created < self.max_size
+            if can_grow:
+                self._created += 1
+        if can_grow:
+            try:
+                return self._create_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.connection_timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No SQLite connection available after {self.connection_timeout}s"
+            )
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool."""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    @contextmanager
+    def get_connection(self) -> Iterator[sqlite3.Connection]:
+        """Context manager yielding a pooled connection."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Context manager yielding a pooled connection inside BEGIN IMMEDIATE/COMMIT."""
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        """Close all idle connections."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
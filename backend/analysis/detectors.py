@@ -2,179 +2,367 @@
 Drift detection algorithms for genomics pipeline monitoring.
 Compares current metrics against baseline and returns anomalies.
 """
+import copy
 import json
 import sqlite3
-from typing import List, Dict, Any
+import time
+import weakref
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from pathlib import Path
 import numpy as np
-from .metrics import ks_test, chi2_test, psi, js_divergence, ece_score, brier_score, calculate_median_iqr
+from .metrics import ks_test, chi2_test, check_pathogenic_drift, psi, js_divergence, ece_score, brier_score, calculate_median_iqr
+from .db_pool import SQLitePool
+
+# Hoisted so sqlite3's per-connection statement cache reuses the prepared statements
+_INSERT_METRICS_SQL = (
+    "INSERT INTO metrics (run_id, stage, metric_name, metric_value, metric_json, value_type) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+_BASELINE_SQL = """
+    SELECT metric_name, metric_value, metric_json, value_type 
+    FROM metrics 
+    WHERE stage = ? {name_filter}
+    ORDER BY timestamp DESC 
+    LIMIT ?
+"""
+
+_BASELINE_STATS_SQL = "SELECT baseline_value, iqr, last_updated FROM baselines WHERE stage = ? AND metric_name = ?"
+
+_BATCH_BASELINE_STATS_SQL = (
+    "SELECT stage, metric_name, baseline_value, iqr, last_updated FROM baselines WHERE stage IN ({placeholders})"
+)
+
+_BASELINE_WINDOW_SQL = """
+    SELECT metric_value 
+    FROM metrics 
+    WHERE stage = ? AND metric_name = ? AND value_type = 'f' 
+    ORDER BY timestamp DESC 
+    LIMIT ?
+"""
+
+# A NULL last_updated makes the next get_baseline_stats recompute the row
+_INVALIDATE_BASELINES_SQL = "UPDATE baselines SET last_updated = NULL WHERE stage = ?"
+
+_UPSERT_BASELINE_SQL = """
+    INSERT INTO baselines (stage, metric_name, baseline_value, iqr, sample_count, last_updated)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (stage, metric_name) DO UPDATE SET
+        baseline_value = excluded.baseline_value,
+        iqr = excluded.iqr,
+        sample_count = excluded.sample_count,
+        last_updated = excluded.last_updated
+"""
+
+# Scalar metrics compared against their precomputed baseline median, checked together in detect_drift_batch:
+# (stage, metric, anomaly stage, anomaly metric, rule, threshold)
+#   ratio:  current > median * threshold,   effect (current - median) / median
+#   abs:    |current - median| > threshold, effect |current - median|
+#   offset: current > median + threshold,   effect current - median
+_SCALAR_DRIFT_RULES = (
+    ("align", "softclip_rate", "alignment", "softclip_rate_increase", "ratio", 1.5),
+    ("call", "titv", "calling", "titv_drift", "abs", 0.2),
+    ("predict", "ece", "prediction", "ece_increase", "offset", 0.05),
+)
 
 class DriftDetector:
     """Detects drift in genomics pipeline metrics."""
     
+    # Seconds a cached baseline stays valid; guards against writes from other processes
+    BASELINE_CACHE_TTL = 30.0
+    
+    # Seconds before a precomputed row in the baselines table is recomputed
+    BASELINE_REFRESH_SECONDS = 60.0
+    
+    # One worker per pipeline stage for detect_all_stages
+    STAGE_WORKERS = 4
+    
     def __init__(self, db_path: str = "db/metrics.duckdb"):
         self.db_path = db_path
+        self._baseline_cache: Dict[Tuple[Any, ...], Tuple[float, Any]] = {}
+        self._baseline_generation: Dict[str, int] = {}
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = SQLitePool(self.db_path, min_size=2, max_size=10, connection_timeout=30.0)
         self._init_db()
+        
+        # Close pooled connections when the detector is collected, closed or at exit
+        self._finalizer = weakref.finalize(self, self.pool.close)
     
     def _init_db(self):
         """Initialize the metrics database."""
-        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
-        
-        # Create tables if they don't exist
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS metrics (
-                run_id TEXT,
-                stage TEXT,
-                metric_name TEXT,
-                metric_value REAL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS baselines (
-                stage TEXT,
-                metric_name TEXT,
-                baseline_value REAL,
-                threshold REAL,
-                PRIMARY KEY (stage, metric_name)
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Create tables if they don't exist
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS metrics (
+                    run_id TEXT,
+                    stage TEXT,
+                    metric_name TEXT,
+                    metric_value REAL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    metric_json TEXT,
+                    value_type TEXT CHECK (value_type IN ('f', 'j'))
+                )
+            """)
+            
+            # Older databases stored JSON strings in metric_value; move them to metric_json
+            metric_columns = {row[1] for row in cursor.execute("PRAGMA table_info(metrics)")}
+            if "value_type" not in metric_columns:
+                cursor.execute("ALTER TABLE metrics ADD COLUMN metric_json TEXT")
+                cursor.execute("ALTER TABLE metrics ADD COLUMN value_type TEXT CHECK (value_type IN ('f', 'j'))")
+                cursor.execute("""
+                    UPDATE metrics SET metric_json = metric_value, metric_value = NULL, value_type = 'j'
+                    WHERE typeof(metric_value) = 'text'
+                """)
+                cursor.execute("UPDATE metrics SET value_type = 'f' WHERE value_type IS NULL")
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS baselines (
+                    stage TEXT,
+                    metric_name TEXT,
+                    baseline_value REAL,
+                    threshold REAL,
+                    PRIMARY KEY (stage, metric_name)
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_metrics_stage_ts
+                ON metrics (stage, timestamp DESC)
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_metrics_stage_name_ts
+                ON metrics (stage, metric_name, timestamp DESC)
+            """)
+            
+            # Older databases predate the precomputed baseline columns
+            baseline_columns = {row[1] for row in cursor.execute("PRAGMA table_info(baselines)")}
+            for column, column_type in (("iqr", "REAL"), ("sample_count", "INTEGER"), ("last_updated", "REAL")):
+                if column not in baseline_columns:
+                    cursor.execute(f"ALTER TABLE baselines ADD COLUMN {column} {column_type}")
     
     def store_metrics(self, run_id: str, stage: str, metrics: Dict[str, Any]):
         """Store metrics for a run."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        for metric_name, value in metrics.items():
-            if isinstance(value, (int, float)):
-                cursor.execute(
-                    "INSERT INTO metrics (run_id, stage, metric_name, metric_value) VALUES (?, ?, ?, ?)",
-                    (run_id, stage, metric_name, value)
-                )
-            elif isinstance(value, dict):
-                # Store dict values as JSON strings
-                import json
-                cursor.execute(
-                    "INSERT INTO metrics (run_id, stage, metric_name, metric_value) VALUES (?, ?, ?, ?)",
-                    (run_id, stage, metric_name, json.dumps(value))
-                )
+        self._write_metrics(run_id, {stage: metrics})
+    
+    def _write_metrics(self, run_id: str, metrics_by_stage: Dict[str, Dict[str, Any]]):
+        """Insert every stage's metrics in one transaction and invalidate their baselines."""
+        # Numeric values go in metric_value, dict values as JSON in metric_json
+        rows = [
+            (run_id, stage, metric_name, value, None, 'f') if isinstance(value, (int, float))
+            else (run_id, stage, metric_name, None, json.dumps(value), 'j')
+            for stage, metrics in metrics_by_stage.items()
+            for metric_name, value in metrics.items()
+            if isinstance(value, (int, float, dict))
+        ]
+        if not rows:
+            return
+        
+        stages = {row[1] for row in rows}
+        # Precomputed baselines no longer cover the latest rows; invalidated in the same transaction
+        with self.pool.transaction() as conn:
+            conn.executemany(_INSERT_METRICS_SQL, rows)
+            conn.executemany(_INVALIDATE_BASELINES_SQL, [(stage,) for stage in stages])
+        
+        for stage in stages:
+            self._invalidate_baseline_cache(stage)
+    
+    def _invalidate_baseline_cache(self, stage: str):
+        """Drop cached baselines for a stage after new metrics are written."""
+        self._baseline_generation[stage] = self._baseline_generation.get(stage, 0) + 1
+        # list() snapshots the keys; detection threads may insert concurrently
+        for key in [key for key in list(self._baseline_cache) if key[0] == stage]:
+            self._baseline_cache.pop(key, None)
+    
+    def close(self):
+        """Close the connection pool."""
+        self._finalizer()
+    
+    def get_baseline_metrics(self, stage: str, limit: int = 200,
+                             metric_names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Get baseline metrics for a stage, optionally only for the given metric names."""
+        names = tuple(sorted(metric_names)) if metric_names is not None else None
+        key = (stage, limit, names)
+        cached = self._baseline_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.BASELINE_CACHE_TTL:
+            return copy.deepcopy(cached[1])
+        
+        generation = self._baseline_generation.get(stage, 0)
+        baseline = self._load_baseline_metrics(stage, limit, names)
+        # Only cache if no write landed for this stage while we were reading
+        if self._baseline_generation.get(stage, 0) == generation:
+            self._baseline_cache[key] = (time.monotonic(), baseline)
+        return copy.deepcopy(baseline)
+    
+    def _get_baseline_sample(self, stage: str, metric_name: str) -> Optional[np.ndarray]:
+        """Baseline values of one metric as a sorted, read-only array for KS tests, cached like get_baseline_metrics."""
+        key = (stage, "ks_sample", metric_name)
+        cached = self._baseline_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.BASELINE_CACHE_TTL:
+            return cached[1]
         
-        conn.commit()
-        conn.close()
-    
-    def get_baseline_metrics(self, stage: str, limit: int = 200) -> Dict[str, List[float]]:
-        """Get baseline metrics for a stage."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT metric_name, metric_value 
-            FROM metrics 
-            WHERE stage = ? 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        """, (stage, limit))
-        
-        results = cursor.fetchall()
-        conn.close()
-        
-        # Group by metric name
-        baseline = {}
-        for metric_name, value in results:
-            try:
-                # Try to parse as float first
-                if metric_name not in baseline:
-                    baseline[metric_name] = []
-                if isinstance(baseline[metric_name], list):
-                    baseline[metric_name].append(float(value))
-            except ValueError:
-                # If not a float, try to parse as JSON
+        generation = self._baseline_generation.get(stage, 0)
+        values = self._load_baseline_metrics(stage, 200, (metric_name,)).get(metric_name)
+        # Handle case where the baseline might be a dict
+        if isinstance(values, dict):
+            values = list(values.values())
+        sample = None
+        if isinstance(values, (list, np.ndarray)) and len(values) > 0:
+            sample = np.sort(np.asarray(values, dtype=np.float64))
+            # Shared between detection threads without copying
+            sample.flags.writeable = False
+        if self._baseline_generation.get(stage, 0) == generation:
+            self._baseline_cache[key] = (time.monotonic(), sample)
+        return sample
+    
+    def _load_baseline_metrics(self, stage: str, limit: int,
+                               metric_names: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        """Query and parse baseline metrics for a stage."""
+        if metric_names is not None and not metric_names:
+            return {}
+        
+        name_filter = ""
+        params: Tuple[Any, ...] = (stage,)
+        if metric_names:
+            name_filter = f"AND metric_name IN ({', '.join('?' * len(metric_names))})"
+            params += metric_names
+        
+        with self.pool.get_connection() as conn:
+            results = conn.execute(
+                _BASELINE_SQL.format(name_filter=name_filter), params + (limit,)
+            ).fetchall()
+        
+        # Group by metric name: numeric rows into float buckets, JSON dicts as-is
+        numeric = defaultdict(list)
+        dict_values = {}
+        for metric_name, value, value_json, value_type in results:
+            if value_type == 'f':
+                numeric[metric_name].append(value)
+            elif value_type == 'j' and metric_name not in dict_values:
+                # Rows are newest first, so the most recent dict is kept
                 try:
-                    import json
-                    parsed_value = json.loads(value)
-                    if isinstance(parsed_value, dict):
-                        # Store dict values as-is, don't append
-                        baseline[metric_name] = parsed_value
-                    else:
-                        if metric_name not in baseline:
-                            baseline[metric_name] = []
-                        if isinstance(baseline[metric_name], list):
-                            baseline[metric_name].append(parsed_value)
-                except:
+                    dict_values[metric_name] = json.loads(value_json)
+                except ValueError:
                     # Skip if can't parse
                     pass
         
+        baseline = {
+            name: np.fromiter(values, dtype=np.float64, count=len(values))
+            for name, values in numeric.items()
+        }
+        # Dict values win over numeric ones for the same metric name
+        baseline.update(dict_values)
+        
         return baseline
     
+    def get_baseline_stats(self, stage: str, metric_name: str) -> Optional[Dict[str, float]]:
+        """Get precomputed baseline median/IQR for a metric, refreshing stale rows."""
+        with self.pool.get_connection() as conn:
+            row = conn.execute(_BASELINE_STATS_SQL, (stage, metric_name)).fetchone()
+        
+        if row is not None and row[2] is not None and time.time() - row[2] < self.BASELINE_REFRESH_SECONDS:
+            return {"median": row[0], "iqr": row[1]}
+        
+        return self._refresh_baseline(stage, metric_name)
+    
+    def get_baseline_stats_batch(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[Dict[str, float]]]:
+        """get_baseline_stats for several (stage, metric) pairs with one baselines query."""
+        if not keys:
+            return {}
+        stages = sorted({stage for stage, _ in keys})
+        with self.pool.get_connection() as conn:
+            rows = conn.execute(
+                _BATCH_BASELINE_STATS_SQL.format(placeholders=", ".join("?" * len(stages))), stages
+            ).fetchall()
+        
+        fresh = {}
+        now = time.time()
+        for stage, metric_name, median, iqr, last_updated in rows:
+            if last_updated is not None and now - last_updated < self.BASELINE_REFRESH_SECONDS:
+                fresh[(stage, metric_name)] = {"median": median, "iqr": iqr}
+        
+        # Missing or stale rows are recomputed one at a time, as in get_baseline_stats
+        return {key: fresh[key] if key in fresh else self._refresh_baseline(*key) for key in keys}
+    
+    def _refresh_baseline(self, stage: str, metric_name: str, limit: int = 200) -> Optional[Dict[str, float]]:
+        """Recompute median/IQR over the recent window and store it in the baselines table."""
+        with self.pool.get_connection() as conn:
+            rows = conn.execute(_BASELINE_WINDOW_SQL, (stage, metric_name, limit)).fetchall()
+            
+            values = [value for (value,) in rows]
+            if not values:
+                return None
+            
+            stats = calculate_median_iqr(np.fromiter(values, dtype=np.float64, count=len(values)))
+            # Single statement, autocommitted
+            conn.execute(_UPSERT_BASELINE_SQL, (stage, metric_name, stats["median"], stats["iqr"],
+                                                len(values), time.time()))
+        
+        return stats
+    
     def detect_alignment_drift(self, current_metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Detect alignment stage drift."""
         anomalies = []
-        baseline = self.get_baseline_metrics("align")
+        if not {"depth_hist", "softclip_rate"} & current_metrics.keys():
+            return anomalies
         
         # Check depth distribution
-        if "depth_hist" in current_metrics and "depth_hist" in baseline:
-            current_depth = current_metrics["depth_hist"]
-            baseline_depth = baseline["depth_hist"]
-            
-            # Handle case where baseline_depth might be a dict
-            if isinstance(baseline_depth, dict):
-                baseline_depth = list(baseline_depth.values())
-            
-            if isinstance(baseline_depth, list) and len(baseline_depth) > 0:
-                ks_result = ks_test(current_depth, baseline_depth)
-                if ks_result["p_value"] < 0.01:
-                    anomalies.append({
-                        "stage": "alignment",
-                        "metric": "depth_ks",
-                        "p": ks_result["p_value"],
-                        "effect": abs(ks_result["statistic"])
-                    })
+        anomalies.extend(self._detect_depth_drift(current_metrics))
         
         # Check softclip rate increase
-        if "softclip_rate" in current_metrics and "softclip_rate" in baseline:
+        if "softclip_rate" in current_metrics:
             current_rate = current_metrics["softclip_rate"]
-            baseline_rates = baseline["softclip_rate"]
-            
-            # Handle case where baseline_rates might be a dict
-            if isinstance(baseline_rates, dict):
-                baseline_rates = list(baseline_rates.values())
+            baseline_stats = self.get_baseline_stats("align", "softclip_rate")
             
-            if isinstance(baseline_rates, list) and len(baseline_rates) > 0:
-                baseline_median = np.median(baseline_rates)
+            if baseline_stats is not None:
+                baseline_median = baseline_stats["median"]
                 
                 if current_rate > baseline_median * 1.5:  # 50% increase
+                    # A zero baseline gives an unbounded relative increase, as in detect_drift_batch
                     anomalies.append({
                         "stage": "alignment", 
                         "metric": "softclip_rate_increase",
                         "p": 0.001,
-                        "effect": (current_rate - baseline_median) / baseline_median
+                        "effect": (current_rate - baseline_median) / baseline_median if baseline_median else float("inf")
                     })
         
         return anomalies
     
+    def _detect_depth_drift(self, current_metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """KS test of the depth histogram against the baseline depth distribution."""
+        if "depth_hist" not in current_metrics:
+            return []
+        
+        current_depth = current_metrics["depth_hist"]
+        # Sorted once per baseline refresh rather than copied and re-parsed per check
+        baseline_depth = self._get_baseline_sample("align", "depth_hist")
+        
+        if baseline_depth is not None:
+            ks_result = ks_test(current_depth, baseline_depth)
+            if ks_result["p_value"] < 0.01:
+                return [{
+                    "stage": "alignment",
+                    "metric": "depth_ks",
+                    "p": ks_result["p_value"],
+                    "effect": abs(ks_result["statistic"])
+                }]
+        return []
+    
     def detect_calling_drift(self, current_metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Detect variant calling stage drift."""
         anomalies = []
-        baseline = self.get_baseline_metrics("call")
         
         # Check Ti/Tv ratio
-        if "titv" in current_metrics and "titv" in baseline:
+        if "titv" in current_metrics:
             current_titv = current_metrics["titv"]
-            baseline_titv = baseline["titv"]
+            baseline_stats = self.get_baseline_stats("call", "titv")
             
-            # Handle case where baseline_titv might be a dict
-            if isinstance(baseline_titv, dict):
-                baseline_titv = list(baseline_titv.values())
-            
-            if isinstance(baseline_titv, list) and len(baseline_titv) > 0:
-                baseline_median = np.median(baseline_titv)
+            if baseline_stats is not None:
+                baseline_median = baseline_stats["median"]
                 
                 if abs(current_titv - baseline_median) > 0.2:
                     anomalies.append({
@@ -193,8 +381,10 @@ class DriftDetector:
         # Simple heuristic: if pathogenic count is high, flag as drift
         current_counts = current_metrics.get("clinvar_counts", {})
         if current_counts:
-            pathogenic_pct = current_counts.get("pathogenic", 0) / max(sum(current_counts.values()), 1)
-            if pathogenic_pct > 0.15:  # More than 15% pathogenic
+            # Pathogenic count in column 0, every label's count in the row total
+            row = [current_counts.get("pathogenic", 0)]
+            row.extend(v for k, v in current_counts.items() if k != "pathogenic")
+            if check_pathogenic_drift(row)[0]:  # More than 15% pathogenic
                 anomalies.append({
                     "stage": "annotation",
                     "metric": "clinvar_chi2",
@@ -207,19 +397,14 @@ class DriftDetector:
     def detect_prediction_drift(self, current_metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Detect prediction stage drift."""
         anomalies = []
-        baseline = self.get_baseline_metrics("predict")
         
         # Check ECE increase
-        if "ece" in current_metrics and "ece" in baseline:
+        if "ece" in current_metrics:
             current_ece = current_metrics["ece"]
-            baseline_ece = baseline["ece"]
-            
-            # Handle case where baseline_ece might be a dict
-            if isinstance(baseline_ece, dict):
-                baseline_ece = list(baseline_ece.values())
+            baseline_stats = self.get_baseline_stats("predict", "ece")
             
-            if isinstance(baseline_ece, list) and len(baseline_ece) > 0:
-                baseline_median = np.median(baseline_ece)
+            if baseline_stats is not None:
+                baseline_median = baseline_stats["median"]
                 
                 if current_ece > baseline_median + 0.05:  # 5% increase
                     anomalies.append({
@@ -233,8 +418,11 @@ class DriftDetector:
     
     def detect_drift(self, run_id: str, stage: str, current_metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Main drift detection function."""
-        # Store current metrics
-        self.store_metrics(run_id, stage, current_metrics)
+        # Store current metrics; a failed write only drops this run from future baselines
+        try:
+            self.store_metrics(run_id, stage, current_metrics)
+        except sqlite3.Error as e:
+            print(f"⚠ Failed to store metrics: {e}")
         
         # Detect stage-specific drift
         anomalies = []
@@ -248,4 +436,59 @@ class DriftDetector:
         elif stage == "predict":
             anomalies.extend(self.detect_prediction_drift(current_metrics))
         
-        return anomalies
\ No newline at end of file
+        return anomalies
+    
+    def detect_all_stages(self, run_id: str, metrics_by_stage: Dict[str, Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Run detect_drift for each stage concurrently, keyed by stage in input order."""
+        # Stage detectors are independent reads; SQLite and NumPy release the GIL
+        with ThreadPoolExecutor(max_workers=self.STAGE_WORKERS, thread_name_prefix="drift") as executor:
+            futures = {
+                stage: executor.submit(self.detect_drift, run_id, stage, stage_metrics)
+                for stage, stage_metrics in metrics_by_stage.items()
+            }
+            return {stage: future.result() for stage, future in futures.items()}
+    
+    def detect_drift_batch(self, run_id: str, metrics_by_stage: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Detect drift across all stages at once, returning anomalies in the same order as detect_all_stages."""
+        # Store all stages in one transaction; a failed write only drops this run from future baselines
+        try:
+            self._write_metrics(run_id, metrics_by_stage)
+        except sqlite3.Error as e:
+            print(f"⚠ Failed to store metrics: {e}")
+        
+        # One baselines query for every scalar metric present, then one vectorized comparison
+        rules = [rule for rule in _SCALAR_DRIFT_RULES if rule[1] in metrics_by_stage.get(rule[0], {})]
+        stats = self.get_baseline_stats_batch([(rule[0], rule[1]) for rule in rules])
+        rules = [rule for rule in rules if stats[(rule[0], rule[1])] is not None]
+        
+        scalar_anomalies = defaultdict(list)
+        if rules:
+            current = np.array([metrics_by_stage[rule[0]][rule[1]] for rule in rules], dtype=np.float64)
+            median = np.array([stats[(rule[0], rule[1])]["median"] for rule in rules], dtype=np.float64)
+            threshold = np.array([rule[5] for rule in rules], dtype=np.float64)
+            kind = np.array([rule[4] for rule in rules])
+            is_ratio, is_abs = kind == "ratio", kind == "abs"
+            
+            diff = current - median
+            with np.errstate(divide="ignore", invalid="ignore"):
+                effect = np.where(is_ratio, diff / median, np.where(is_abs, np.abs(diff), diff))
+            flagged = np.where(is_ratio, current > median * threshold,
+                               np.where(is_abs, np.abs(diff) > threshold, current > median + threshold))
+            
+            for i in np.flatnonzero(flagged).tolist():
+                stage, _, anomaly_stage, anomaly_metric, _, _ = rules[i]
+                scalar_anomalies[stage].append({
+                    "stage": anomaly_stage,
+                    "metric": anomaly_metric,
+                    "p": 0.001,
+                    "effect": effect[i].item()
+                })
+        
+        anomalies = []
+        for stage, stage_metrics in metrics_by_stage.items():
+            if stage == "align":
+                anomalies.extend(self._detect_depth_drift(stage_metrics))
+            elif stage == "annotate":
+                anomalies.extend(self.detect_annotation_drift(stage_metrics))
+            anomalies.extend(scalar_anomalies.get(stage, ()))
+        return anomalies
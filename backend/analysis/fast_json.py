@@ -0,0 +1,46 @@
+"""
+JSON encode/decode helpers for report and API hot paths.
+Uses orjson when installed and falls back to the stdlib json module.
+"""
+import json
+from typing import Any
+
+# Optional orjson import for faster (de)serialization
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes, optionally with 2-space indentation and sorted keys."""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            # Types orjson won't encode (e.g. float subclasses) still go through json
+            pass
+    text = json.dumps(obj, indent=2 if indent else None, sort_keys=sort_keys,
+                      separators=None if indent else (",", ":"), ensure_ascii=False)
+    return text.encode("utf-8")
+
+def loads(data: Any) -> Any:
+    """Parse JSON from bytes or str."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dump(obj: Any, path: Any, indent: bool = True):
+    """Write obj as JSON to path."""
+    with open(path, 'wb') as f:
+        f.write(dumps(obj, indent=indent))
+
+def load(path: Any) -> Any:
+    """Read JSON from path."""
+    with open(path, 'rb') as f:
+        return loads(f.read())
@@ -2,12 +2,20 @@
 Hypothesis ranking for genomics pipeline drift investigation.
 Ranks potential causes based on version changes and anomaly signatures.
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import numpy as np
 
 class HypothesisRanker:
     """Ranks hypotheses based on evidence and priors."""
     
+    # kg_delta flag -> version change type
+    _VERSION_MAP: Tuple[Tuple[str, str], ...] = (
+        ("reference_changed", "reference_change"),
+        ("db_version_changed", "db_version_change"),
+        ("caller_changed", "caller_change"),
+        ("model_changed", "model_change")
+    )
+    
     def __init__(self):
         # Prior weights for different types of changes
         self.priors = {
@@ -61,76 +69,84 @@ class HypothesisRanker:
                 "version_indicators": []
             }
         }
+        
+        self._build_score_matrices()
+    
+    def _build_score_matrices(self):
+        """Precompute prior/likelihood/signature matrices indexed by hypothesis."""
+        self.hyp_ids = {hyp_id: i for i, hyp_id in enumerate(self.hypotheses)}
+        self.change_ids = {change: i for i, change in enumerate(self.priors)}
+        
+        # dict keys as an ordered set: O(1) membership, first-seen order
+        signatures = dict.fromkeys(self.likelihoods)
+        for hyp_data in self.hypotheses.values():
+            signatures.update(dict.fromkeys(hyp_data["signatures"]))
+        self.sig_ids = {sig: i for i, sig in enumerate(signatures)}
+        
+        n_hyp, n_change, n_sig = len(self.hyp_ids), len(self.change_ids), len(self.sig_ids)
+        self.prior_matrix = np.zeros((n_hyp, n_change))
+        self.likelihood_matrix = np.zeros((n_hyp, n_sig))
+        self.signature_mask = np.zeros((n_hyp, n_sig))
+        
+        change_ids, sig_ids, priors, likelihoods = self.change_ids, self.sig_ids, self.priors, self.likelihoods
+        for hyp_id, h in self.hyp_ids.items():
+            hyp_data = self.hypotheses[hyp_id]
+            for change in hyp_data["version_indicators"]:
+                c = change_ids.get(change)
+                if c is not None:
+                    self.prior_matrix[h, c] = priors[change]
+            for sig in hyp_data["signatures"]:
+                s = sig_ids[sig]
+                self.signature_mask[h, s] = 1.0
+                self.likelihood_matrix[h, s] = likelihoods.get(sig, {}).get(hyp_id, 0.0)
     
     def rank_hypotheses(self, kg_delta: Dict[str, Any], anomalies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Rank hypotheses based on evidence."""
-        scores = {}
+        change_ids, sig_ids, hypotheses = self.change_ids, self.sig_ids, self.hypotheses
         
         # Extract version changes from kg_delta
         version_changes = self._extract_version_changes(kg_delta)
-        
-        # Extract anomaly signatures
-        anomaly_signatures = [anomaly["metric"] for anomaly in anomalies]
-        
-        # Score each hypothesis
-        for hyp_id, hyp_data in self.hypotheses.items():
-            score = self._calculate_hypothesis_score(
-                hyp_id, hyp_data, version_changes, anomaly_signatures, anomalies
-            )
-            scores[hyp_id] = score
-        
-        # Sort by score (descending)
+        change_idx = [c for c in map(change_ids.get, version_changes) if c is not None]
+        change_vec = np.bincount(change_idx, minlength=len(change_ids)).astype(np.float64)
+        
+        # Only anomalies whose signature some hypothesis knows about contribute
+        scored_idx = [(s, anomaly) for anomaly in anomalies
+                      if (s := sig_ids.get(anomaly["metric"])) is not None]
+        n_scored = len(scored_idx)
+        sig_idx = np.fromiter((s for s, _ in scored_idx), dtype=np.intp, count=n_scored)
+        sig_vec = np.bincount(sig_idx, minlength=len(sig_ids)).astype(np.float64)
+        
+        # Boost based on effect size and p-value, one log10 over all anomalies, summed per signature
+        effects = np.fromiter((anomaly.get("effect", 0.0) for _, anomaly in scored_idx),
+                              dtype=np.float64, count=n_scored)
+        p_values = np.fromiter((anomaly.get("p", 1.0) for _, anomaly in scored_idx),
+                               dtype=np.float64, count=n_scored)
+        np.clip(p_values, 1e-300, 1.0, out=p_values)
+        boosts = np.minimum(effects * 0.5, 1.0) + np.maximum(0.0, -np.log10(p_values) * 0.1)
+        boost_vec = np.bincount(sig_idx, weights=boosts, minlength=len(sig_ids))
+        
+        # Score every hypothesis at once
+        scores = (self.prior_matrix @ change_vec
+                  + self.likelihood_matrix @ sig_vec
+                  + self.signature_mask @ boost_vec)
+        
+        # Sort by score (descending), ties keep definition order
+        hyp_ids = list(self.hyp_ids)
+        score_list = scores.tolist()
         ranked_hypotheses = []
-        for hyp_id, score in sorted(scores.items(), key=lambda x: x[1], reverse=True):
+        for h in np.argsort(-scores, kind="stable").tolist():
+            hyp_id = hyp_ids[h]
             ranked_hypotheses.append({
                 "id": hyp_id,
-                "label": self.hypotheses[hyp_id]["label"],
-                "score": round(score, 2)
+                "label": hypotheses[hyp_id]["label"],
+                "score": round(score_list[h], 2)
             })
         
         return ranked_hypotheses
     
     def _extract_version_changes(self, kg_delta: Dict[str, Any]) -> List[str]:
         """Extract version changes from knowledge graph delta."""
-        changes = []
-        
-        if kg_delta.get("reference_changed"):
-            changes.append("reference_change")
-        if kg_delta.get("db_version_changed"):
-            changes.append("db_version_change")
-        if kg_delta.get("caller_changed"):
-            changes.append("caller_change")
-        if kg_delta.get("model_changed"):
-            changes.append("model_change")
-        
-        return changes
-    
-    def _calculate_hypothesis_score(self, hyp_id: str, hyp_data: Dict[str, Any], 
-                                  version_changes: List[str], anomaly_signatures: List[str],
-                                  anomalies: List[Dict[str, Any]]) -> float:
-        """Calculate score for a hypothesis."""
-        score = 0.0
-        
-        # Prior score based on version changes
-        for change in version_changes:
-            if change in hyp_data["version_indicators"]:
-                score += self.priors.get(change, 0.0)
-        
-        # Likelihood score based on anomaly signatures
-        for signature in anomaly_signatures:
-            if signature in hyp_data["signatures"]:
-                likelihood = self.likelihoods.get(signature, {}).get(hyp_id, 0.0)
-                score += likelihood
-        
-        # Boost score for strong anomalies
-        for anomaly in anomalies:
-            if anomaly["metric"] in hyp_data["signatures"]:
-                # Boost based on effect size and p-value
-                effect_boost = min(anomaly.get("effect", 0.0) * 0.5, 1.0)
-                p_boost = max(0.0, -np.log10(anomaly.get("p", 1.0)) * 0.1)
-                score += effect_boost + p_boost
-        
-        return score
+        return [change for flag, change in self._VERSION_MAP if kg_delta.get(flag)]
     
     def update_hypothesis_confidence(self, hypothesis_id: str, probe_result: Dict[str, Any]) -> float:
         """Update hypothesis confidence based on probe results."""
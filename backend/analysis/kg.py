@@ -1,27 +1,125 @@
 """
 Knowledge graph construction for genomics pipeline runs.
-Builds networkx graph and exports to vis-network format.
+Tracks nodes/edges as plain dicts and exports to vis-network and GML formats.
 """
 import networkx as nx
 import json
 import hashlib
-from typing import Dict, List, Any
+import mmap
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
-import datetime
+from datetime import datetime, timezone
+from .db_pool import SQLitePool
+
+# vis-network colors by node/edge type
+_NODE_COLORS = {
+    "Run": "#FF6B6B",
+    "Reference": "#4ECDC4", 
+    "Aligner": "#45B7D1",
+    "Caller": "#96CEB4",
+    "VCF": "#FFEAA7",
+    "Annotator": "#DDA0DD",
+    "DBVersion": "#98D8C8",
+    "Predictor": "#F7DC6F",
+    "Output": "#BB8FCE"
+}
+
+_EDGE_COLORS = {
+    "uses": "#3498DB",
+    "produced_by": "#E74C3C",
+    "depends_on": "#F39C12"
+}
+
+_DEFAULT_COLOR = "#95A5A6"
+
+# Files above this size are hashed through mmap rather than buffered reads
+_MMAP_HASH_THRESHOLD = 64 * 1024 * 1024
+
+# In-memory digests kept across graphs; evicted ones are still found in the SQLite cache
+_HASH_CACHE_SIZE = 4096
+
+# Persistent digest cache under backend/db, whatever the working directory
+_DEFAULT_HASH_CACHE_DB = str(Path(__file__).resolve().parent.parent / "db" / "metrics.duckdb")
+
+# vis-network labels by node type, called with (node_id, data)
+_LABEL_FORMATTERS = {
+    "Run": lambda node_id, data: f"Run {data.get('run_id', '')}",
+    "Reference": lambda node_id, data: f"Ref {data.get('build', '')}",
+    "Aligner": lambda node_id, data: f"Align {data.get('tag', '')}",
+    "Caller": lambda node_id, data: f"Call {data.get('tag', '')}",
+    "VCF": lambda node_id, data: f"VCF {node_id[-8:]}",
+    "Annotator": lambda node_id, data: f"Annot {data.get('tool', '')}",
+    "DBVersion": lambda node_id, data: f"DB {data.get('version', '')}",
+    "Predictor": lambda node_id, data: f"Model {data.get('model', '')}",
+    "Output": lambda node_id, data: f"Out {data.get('output_type', '')}"
+}
+
+def _node_label(node_id: str, data: Dict[str, Any]) -> str:
+    """Get label for vis-network node."""
+    formatter = _LABEL_FORMATTERS.get(data.get("type", "unknown"))
+    return formatter(node_id, data) if formatter else node_id
+
+def _node_title(data: Dict[str, Any]) -> str:
+    """Get title (tooltip) for vis-network node."""
+    parts = [
+        f"timestamp: {datetime.fromtimestamp(value / 1e9, tz=timezone.utc).isoformat()}"
+        if key == "timestamp_ns" else f"{key}: {value}"
+        for key, value in data.items() if key not in ("type", "metrics")
+    ]
+    if "metrics" in data:
+        parts.append(f"Metrics: {len(data['metrics'])} items")
+    return "\\n".join(parts)
 
 class KnowledgeGraph:
     """Builds knowledge graphs for genomics pipeline runs."""
     
-    def __init__(self):
-        self.graph = nx.DiGraph()
+    # File digests shared across graphs, keyed on (abspath, mtime_ns, size), least recently used first
+    _hash_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+    _hash_cache_lock = threading.Lock()
+    
+    def __init__(self, hash_cache_db: Optional[str] = _DEFAULT_HASH_CACHE_DB):
+        # Node/edge attributes plus their vis-network entries, kept in insertion order.
+        # Re-adding an existing node or edge updates its attributes, as networkx did.
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+        self._edges: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._vis_nodes: Dict[str, Dict[str, Any]] = {}
+        self._vis_edges: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        
+        # Persist digests so stable inputs (references, models) are hashed once across processes
+        self._hash_pool = None
+        if hash_cache_db:
+            Path(hash_cache_db).parent.mkdir(parents=True, exist_ok=True)
+            self._hash_pool = SQLitePool(hash_cache_db, min_size=1, max_size=2)
+            with self._hash_pool.get_connection() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS file_hash_cache (
+                        path TEXT,
+                        mtime INTEGER,
+                        size INTEGER,
+                        digest TEXT,
+                        PRIMARY KEY (path, mtime, size)
+                    )
+                """)
+            # Close pooled connections when the graph is collected, closed or at exit
+            self._finalizer = weakref.finalize(self, self._hash_pool.close)
+    
+    def close(self):
+        """Close the digest cache's connection pool."""
+        if self._hash_pool is not None:
+            self._finalizer()
     
     def add_run_node(self, run_id: str, metadata: Dict[str, Any] = None):
         """Add a run node to the graph."""
-        self.graph.add_node(
+        self._add_node(
             f"run_{run_id}",
             type="Run",
             run_id=run_id,
-            timestamp=datetime.datetime.now().isoformat(),
+            timestamp_ns=time.time_ns(),
             metadata=metadata or {}
         )
     
@@ -30,7 +128,7 @@ class KnowledgeGraph:
         ref_hash = self._get_file_hash(ref_path)
         node_id = f"ref_{ref_hash[:8]}"
         
-        self.graph.add_node(
+        self._add_node(
             node_id,
             type="Reference",
             build=build,
@@ -42,7 +140,7 @@ class KnowledgeGraph:
     def add_aligner_node(self, tag: str, version: str = None):
         """Add an aligner node."""
         node_id = f"aligner_{tag}"
-        self.graph.add_node(
+        self._add_node(
             node_id,
             type="Aligner",
             tag=tag,
@@ -53,7 +151,7 @@ class KnowledgeGraph:
     def add_caller_node(self, tag: str, version: str = None):
         """Add a variant caller node."""
         node_id = f"caller_{tag}"
-        self.graph.add_node(
+        self._add_node(
             node_id,
             type="Caller",
             tag=tag,
@@ -61,12 +159,12 @@ class KnowledgeGraph:
         )
         return node_id
     
-    def add_vcf_node(self, vcf_path: str):
-        """Add a VCF file node."""
-        vcf_hash = self._get_file_hash(vcf_path)
+    def add_vcf_node(self, vcf_path: str, simulated: bool = False):
+        """Add a VCF file node; simulated marks a placeholder path from simulation mode."""
+        vcf_hash = self._get_file_hash(vcf_path, simulated)
         node_id = f"vcf_{vcf_hash[:8]}"
         
-        self.graph.add_node(
+        self._add_node(
             node_id,
             type="VCF",
             hash=vcf_hash,
@@ -77,7 +175,7 @@ class KnowledgeGraph:
     def add_annotator_node(self, tool: str, db_version: str):
         """Add an annotation tool node."""
         node_id = f"annotator_{tool}_{db_version}"
-        self.graph.add_node(
+        self._add_node(
             node_id,
             type="Annotator",
             tool=tool,
@@ -88,7 +186,7 @@ class KnowledgeGraph:
     def add_db_version_node(self, db_id: str, version: str):
         """Add a database version node."""
         node_id = f"db_{db_id}_{version}"
-        self.graph.add_node(
+        self._add_node(
             node_id,
             type="DBVersion",
             id=db_id,
@@ -101,7 +199,7 @@ class KnowledgeGraph:
         model_hash = self._get_file_hash(model_path)
         node_id = f"predictor_{model_hash[:8]}"
         
-        self.graph.add_node(
+        self._add_node(
             node_id,
             type="Predictor",
             model=model_name or "unknown",
@@ -110,12 +208,12 @@ class KnowledgeGraph:
         )
         return node_id
     
-    def add_output_node(self, output_path: str, output_type: str):
-        """Add an output node."""
-        output_hash = self._get_file_hash(output_path)
+    def add_output_node(self, output_path: str, output_type: str, simulated: bool = False):
+        """Add an output node; simulated marks a placeholder path from simulation mode."""
+        output_hash = self._get_file_hash(output_path, simulated)
         node_id = f"output_{output_hash[:8]}"
         
-        self.graph.add_node(
+        self._add_node(
             node_id,
             type="Output",
             output_type=output_type,
@@ -124,145 +222,150 @@ class KnowledgeGraph:
         )
         return node_id
     
+    def _add_node(self, node_id: str, **attrs):
+        """Add a node or update its attributes."""
+        data = self._nodes.setdefault(node_id, {})
+        data.update(attrs)
+        self._refresh_vis_node(node_id)
+    
+    def _refresh_vis_node(self, node_id: str):
+        """Rebuild the vis-network entry for a node."""
+        data = self._nodes[node_id]
+        self._vis_nodes[node_id] = {
+            "id": node_id,
+            "label": _node_label(node_id, data),
+            "group": data.get("type", "unknown"),
+            "title": _node_title(data),
+            "color": _NODE_COLORS.get(data.get("type"), _DEFAULT_COLOR)
+        }
+    
     def add_edge(self, source: str, target: str, edge_type: str, metadata: Dict[str, Any] = None):
         """Add an edge between nodes."""
-        self.graph.add_edge(
-            source, target,
-            type=edge_type,
-            metadata=metadata or {}
-        )
+        # Edges to unknown nodes create bare nodes
+        for node_id in (source, target):
+            if node_id not in self._nodes:
+                self._add_node(node_id)
+        
+        data = self._edges.setdefault((source, target), {})
+        data.update(type=edge_type, metadata=metadata or {})
+        self._vis_edges[(source, target)] = {
+            "from": source,
+            "to": target,
+            "label": edge_type,
+            "arrows": "to",
+            "color": _EDGE_COLORS.get(edge_type, _DEFAULT_COLOR)
+        }
     
     def attach_metrics(self, node_id: str, metrics: Dict[str, Any]):
         """Attach metrics to a node."""
-        if node_id in self.graph:
-            self.graph.nodes[node_id]["metrics"] = metrics
+        if node_id in self._nodes:
+            self._nodes[node_id]["metrics"] = metrics
+            self._refresh_vis_node(node_id)
     
-    def _get_file_hash(self, file_path: str) -> str:
-        """Get SHA256 hash of a file."""
-        if not Path(file_path).exists():
-            return "missing"
-        
-        with open(file_path, 'rb') as f:
-            return hashlib.sha256(f.read()).hexdigest()
+    @property
+    def graph(self) -> nx.DiGraph:
+        """Materialize a networkx graph for callers that need graph algorithms."""
+        return self._to_networkx()
     
-    def to_vis_network(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Convert to vis-network format."""
-        nodes = []
-        edges = []
-        
-        for node_id, data in self.graph.nodes(data=True):
-            # Create vis-network node
-            vis_node = {
-                "id": node_id,
-                "label": self._get_node_label(node_id, data),
-                "group": data.get("type", "unknown"),
-                "title": self._get_node_title(data)
-            }
-            
-            # Add color based on type
-            vis_node["color"] = self._get_node_color(data.get("type"))
-            
-            nodes.append(vis_node)
-        
-        for source, target, data in self.graph.edges(data=True):
-            # Create vis-network edge
-            vis_edge = {
-                "from": source,
-                "to": target,
-                "label": data.get("type", ""),
-                "arrows": "to"
-            }
-            
-            # Add color based on edge type
-            vis_edge["color"] = self._get_edge_color(data.get("type"))
-            
-            edges.append(vis_edge)
-        
-        return {"nodes": nodes, "edges": edges}
+    def _to_networkx(self, drop_none: bool = False) -> nx.DiGraph:
+        """Build a networkx DiGraph from the stored nodes and edges."""
+        graph = nx.DiGraph()
+        for node_id, data in self._nodes.items():
+            graph.add_node(node_id, **{k: v for k, v in data.items() if not (drop_none and v is None)})
+        for (source, target), data in self._edges.items():
+            graph.add_edge(source, target, **{k: v for k, v in data.items() if not (drop_none and v is None)})
+        return graph
     
-    def _get_node_label(self, node_id: str, data: Dict[str, Any]) -> str:
-        """Get label for vis-network node."""
-        node_type = data.get("type", "unknown")
+    def _get_file_hash(self, file_path: str, simulated: bool = False) -> str:
+        """Get SHA256 hash of a file, reusing cached digests for unchanged files."""
+        # Placeholders have no content; a digest of the path keeps distinct placeholders as distinct nodes
+        if simulated:
+            return hashlib.sha256(f"simulated:{os.path.abspath(file_path)}".encode()).hexdigest()
+        
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return "missing"
         
-        if node_type == "Run":
-            return f"Run {data.get('run_id', '')}"
-        elif node_type == "Reference":
-            return f"Ref {data.get('build', '')}"
-        elif node_type == "Aligner":
-            return f"Align {data.get('tag', '')}"
-        elif node_type == "Caller":
-            return f"Call {data.get('tag', '')}"
-        elif node_type == "VCF":
-            return f"VCF {node_id[-8:]}"
-        elif node_type == "Annotator":
-            return f"Annot {data.get('tool', '')}"
-        elif node_type == "DBVersion":
-            return f"DB {data.get('version', '')}"
-        elif node_type == "Predictor":
-            return f"Model {data.get('model', '')}"
-        elif node_type == "Output":
-            return f"Out {data.get('output_type', '')}"
+        key = (os.path.abspath(file_path), st.st_mtime_ns, st.st_size)
+        digest = self._cached_digest(key)
+        if digest is not None:
+            return digest
         
-        return node_id
-    
-    def _get_node_title(self, data: Dict[str, Any]) -> str:
-        """Get title (tooltip) for vis-network node."""
-        title_parts = []
+        if self._hash_pool is not None:
+            with self._hash_pool.get_connection() as conn:
+                row = conn.execute(
+                    "SELECT digest FROM file_hash_cache WHERE path = ? AND mtime = ? AND size = ?", key
+                ).fetchone()
+            if row is not None:
+                self._remember_digest(key, row[0])
+                return row[0]
         
-        for key, value in data.items():
-            if key not in ["type", "metrics"]:
-                title_parts.append(f"{key}: {value}")
+        digest = self._hash_file(file_path)
+        self._remember_digest(key, digest)
         
-        if "metrics" in data:
-            title_parts.append(f"Metrics: {len(data['metrics'])} items")
+        if self._hash_pool is not None:
+            with self._hash_pool.get_connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO file_hash_cache (path, mtime, size, digest) VALUES (?, ?, ?, ?)",
+                    key + (digest,)
+                )
         
-        return "\\n".join(title_parts)
+        return digest
     
-    def _get_node_color(self, node_type: str) -> str:
-        """Get color for vis-network node based on type."""
-        colors = {
-            "Run": "#FF6B6B",
-            "Reference": "#4ECDC4", 
-            "Aligner": "#45B7D1",
-            "Caller": "#96CEB4",
-            "VCF": "#FFEAA7",
-            "Annotator": "#DDA0DD",
-            "DBVersion": "#98D8C8",
-            "Predictor": "#F7DC6F",
-            "Output": "#BB8FCE"
-        }
-        return colors.get(node_type, "#95A5A6")
+    @classmethod
+    def _cached_digest(cls, key: Tuple[str, int, int]) -> Optional[str]:
+        """Look up an in-memory digest, marking it most recently used."""
+        with cls._hash_cache_lock:
+            digest = cls._hash_cache.get(key)
+            if digest is not None:
+                cls._hash_cache.move_to_end(key)
+            return digest
     
-    def _get_edge_color(self, edge_type: str) -> str:
-        """Get color for vis-network edge based on type."""
-        colors = {
-            "uses": "#3498DB",
-            "produced_by": "#E74C3C",
-            "depends_on": "#F39C12"
-        }
-        return colors.get(edge_type, "#95A5A6")
+    @classmethod
+    def _remember_digest(cls, key: Tuple[str, int, int], digest: str):
+        """Cache a digest in memory, evicting the least recently used beyond _HASH_CACHE_SIZE."""
+        with cls._hash_cache_lock:
+            cls._hash_cache[key] = digest
+            cls._hash_cache.move_to_end(key)
+            while len(cls._hash_cache) > _HASH_CACHE_SIZE:
+                cls._hash_cache.popitem(last=False)
+    
+    def _hash_file(self, file_path: str) -> str:
+        """Compute SHA256 hash of a file."""
+        with open(file_path, 'rb') as f:
+            # Large files (references, BAMs): hash one contiguous mapping with kernel readahead
+            if os.fstat(f.fileno()).st_size > _MMAP_HASH_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    return hashlib.sha256(mm).hexdigest()
+            
+            # Stream the file instead of loading it into memory
+            if hasattr(hashlib, "file_digest"):
+                return hashlib.file_digest(f, "sha256").hexdigest()
+            
+            # Python < 3.11
+            h = hashlib.sha256()
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+            return h.hexdigest()
+    
+    def to_vis_network(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Convert to vis-network format."""
+        return {"nodes": list(self._vis_nodes.values()), "edges": list(self._vis_edges.values())}
     
     def save_graph(self, run_id: str, output_dir: str):
         """Save graph in multiple formats."""
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
-        # Create a clean graph without None values for GML export
-        clean_graph = nx.DiGraph()
-        for node_id, data in self.graph.nodes(data=True):
-            clean_data = {k: v for k, v in data.items() if v is not None}
-            clean_graph.add_node(node_id, **clean_data)
-        
-        for source, target, data in self.graph.edges(data=True):
-            clean_data = {k: v for k, v in data.items() if v is not None}
-            clean_graph.add_edge(source, target, **clean_data)
-        
-        # Save networkx graph
-        nx.write_gml(clean_graph, output_path / "kg.gml")
+        # networkx is only needed for GML export; GML can't encode None values
+        nx.write_gml(self._to_networkx(drop_none=True), output_path / "kg.gml")
         
         # Save vis-network JSON
         vis_data = self.to_vis_network()
         with open(output_path / "kg.json", 'w') as f:
             json.dump(vis_data, f, indent=2)
         
-        return str(output_path / "kg.json")
\ No newline at end of file
+        return str(output_path / "kg.json")
@@ -3,159 +3,413 @@ LLM-powered analysis for genomics pipeline drift investigation.
 Uses Gemini via LangChain to provide structured analysis.
 """
 import os
+import re
 import json
-from typing import List, Dict, Any, Optional
+import hashlib
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
+from .llm_cache import LLMCache
+
+# Fenced JSON block, with or without the json language tag
+_JSON_BLOCK = re.compile(r"```(?:json)?\s*\n(.*?)```", re.S)
+_JSON_DECODER = json.JSONDecoder()
+
+# Fallback text parsers: whole stripped lines starting "1."-"3.", or mentioning an action prefix
+_NUMBERED_LINE = re.compile(r"^[^\S\n]*([1-3]\.[^\n]*?)[^\S\n]*$", re.M)
+_ACTION_LINE = re.compile(r"^[^\S\n]*([^\n]*?(?:Fixing:|Rerunning:|Found:|Execute:)[^\n]*?)[^\S\n]*$", re.M)
+
+# Structured output schemas: a 3-part list, or the three analyze_all sections
+_PARTS_SCHEMA = {"type": "ARRAY", "items": {"type": "STRING"}}
+_BATCH_SCHEMA = {"type": "ARRAY", "items": _PARTS_SCHEMA}
+_SECTIONS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "evidence": _PARTS_SCHEMA,
+        "remediation": _PARTS_SCHEMA,
+        "actions": _PARTS_SCHEMA
+    },
+    "required": ["evidence", "remediation", "actions"]
+}
+
+# Gemini clients shared across analyzer instances, keyed by (model, temperature, api key hash)
+_CLIENTS: Dict[Tuple[str, float, str], ChatGoogleGenerativeAI] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+class _SectionStreamParser:
+    """Incrementally parses {"key": [item, ...], ...} and emits items as they close."""
+    
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.done = False
+        self.key = None
+        self.last_string = ""
+        self.token = []
+        self.item = None
+    
+    def feed(self, text: str) -> Iterator[Tuple[str, Any]]:
+        """Consume a chunk of text, yielding (key, item) for every completed list item."""
+        for char in text:
+            if self.done:
+                return
+            if self.item is not None:
+                self.item.append(char)
+            
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_string = json.loads("".join(self.token) + '"')
+                    elif self.depth == 2:
+                        yield from self._close_item()
+                if self.depth == 1:
+                    self.token.append(char)
+                continue
+            
+            # Anything before the opening brace (code fences, prose) is skipped
+            if self.depth == 0 and char != "{":
+                continue
+            
+            if char == '"':
+                self.in_string = True
+                if self.depth == 1:
+                    self.token = ['"']
+                elif self.depth == 2 and self.item is None:
+                    self.item = [char]
+            elif char in "{[":
+                if self.depth == 1 and char == "[":
+                    self.key = self.last_string
+                elif self.depth == 2 and self.item is None:
+                    self.item = [char]
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == 2 and self.item is not None:
+                    # Scalar item terminated by the closing bracket
+                    self.item.pop()
+                    yield from self._close_item()
+                self.depth -= 1
+                if self.depth == 2 and self.item is not None:
+                    yield from self._close_item()
+                elif self.depth == 0:
+                    self.done = True
+            elif self.depth == 2:
+                if char == ",":
+                    if self.item is not None:
+                        self.item.pop()
+                        yield from self._close_item()
+                elif not char.isspace() and self.item is None:
+                    self.item = [char]
+    
+    def _close_item(self) -> Iterator[Tuple[str, Any]]:
+        """Emit the buffered list item."""
+        raw, self.item = "".join(self.item), None
+        try:
+            yield self.key, json.loads(raw)
+        except json.JSONDecodeError:
+            pass
 
 class LLMAnalyzer:
     """LLM-powered analysis for genomics drift investigation."""
     
+    MODEL = "gemini-2.5-flash-lite"
+    TEMPERATURE = 0.1
+    
+    # Anomalies per analyze_many request
+    MAX_BATCH_SIZE = 20
+    
     def __init__(self, api_key: Optional[str] = None):
         """Initialize the LLM analyzer."""
         self.api_key = api_key or os.getenv("GEMINI_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_KEY environment variable is required")
         
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash-lite",
-            google_api_key=self.api_key,
-            temperature=0.1
+        key = (self.MODEL, self.TEMPERATURE, hashlib.sha256(self.api_key.encode()).hexdigest())
+        with _CLIENTS_LOCK:
+            self.llm = _CLIENTS.get(key)
+            if self.llm is None:
+                self.llm = _CLIENTS[key] = ChatGoogleGenerativeAI(
+                    model=self.MODEL,
+                    google_api_key=self.api_key,
+                    temperature=self.TEMPERATURE
+                )
+        self.cache = LLMCache()
+    
+    def _cache_key(self, prompt: str, schema: Dict[str, Any]) -> str:
+        """Cache key for a single-message prompt and its response schema."""
+        return LLMCache.make_key(self.MODEL, self.TEMPERATURE, [{"role": "user", "content": prompt}],
+                                 response_schema=schema)
+    
+    def _generation_config(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Ask Gemini for JSON matching schema instead of fenced free text."""
+        return {"response_mime_type": "application/json", "response_schema": schema}
+    
+    def _invoke(self, prompt: str, schema: Dict[str, Any] = _PARTS_SCHEMA) -> str:
+        """Send a prompt to the LLM, reusing the cached response for identical prompts."""
+        return self.cache.get_or_call(
+            self._cache_key(prompt, schema), self.MODEL,
+            lambda: self.llm.invoke([HumanMessage(content=prompt)],
+                                    generation_config=self._generation_config(schema)).content
         )
     
+    def analyze_all(self, anomalies: List[Dict[str, Any]], metrics: Dict[str, Any],
+                    hypotheses: List[Dict[str, Any]], case_state: str,
+                    current_step: str) -> Dict[str, List[str]]:
+        """Generate evidence, remediation and current actions in a single LLM request."""
+        prompt = self._all_prompt(anomalies, metrics, hypotheses, case_state, current_step)
+        
+        content = self._invoke(prompt, _SECTIONS_SCHEMA)
+        
+        parsed = self._extract_json(content)
+        if not isinstance(parsed, dict):
+            parsed = {}
+        
+        sections = (
+            ("evidence", self._parse_evidence_response),
+            ("remediation", self._parse_remediation_response),
+            ("actions", self._parse_current_actions_response)
+        )
+        result = {}
+        for key, fallback in sections:
+            if key in parsed:
+                result[key] = self._to_parts(parsed[key])
+            else:
+                result[key] = fallback(content)
+        return result
+    
+    def stream_all(self, anomalies: List[Dict[str, Any]], metrics: Dict[str, Any],
+                   hypotheses: List[Dict[str, Any]], case_state: str,
+                   current_step: str) -> Iterator[Tuple[str, str]]:
+        """Stream the analyze_all sections, yielding (section, text) as each item arrives."""
+        prompt = self._all_prompt(anomalies, metrics, hypotheses, case_state, current_step)
+        
+        # A cached response is replayed as a single chunk
+        key = self._cache_key(prompt, _SECTIONS_SCHEMA)
+        cached = self.cache.get(key)
+        chunks = [cached] if cached is not None else (
+            chunk.content for chunk in self.llm.stream(
+                [HumanMessage(content=prompt)], generation_config=self._generation_config(_SECTIONS_SCHEMA)
+            )
+        )
+        
+        parser = _SectionStreamParser()
+        content = []
+        emitted = {"evidence": 0, "remediation": 0, "actions": 0}
+        for text in chunks:
+            content.append(text)
+            for section, value in parser.feed(text):
+                if emitted.get(section, 3) < 3:
+                    emitted[section] += 1
+                    yield section, self._to_part(value)
+        
+        full_content = "".join(content)
+        if cached is None:
+            self.cache.set(key, self.MODEL, full_content)
+        
+        # Sections the model didn't return as JSON fall back to the text parsers
+        fallbacks = (
+            ("evidence", self._parse_evidence_response),
+            ("remediation", self._parse_remediation_response),
+            ("actions", self._parse_current_actions_response)
+        )
+        for key, fallback in fallbacks:
+            if not emitted[key]:
+                for text in fallback(full_content):
+                    yield key, text
+    
+    def analyze_many(self, anomalies: List[Dict[str, Any]],
+                     max_batch_size: Optional[int] = None) -> List[List[str]]:
+        """Generate 3-part evidence for every anomaly, batching many anomalies per request."""
+        batch_size = max_batch_size or self.MAX_BATCH_SIZE
+        results = []
+        for start in range(0, len(anomalies), batch_size):
+            batch = anomalies[start:start + batch_size]
+            content = self._invoke(self._batch_prompt(batch), _BATCH_SCHEMA)
+            
+            parsed = self._extract_json(content)
+            if not isinstance(parsed, list):
+                parsed = []
+            
+            # Anomalies the model skipped get the default evidence parts
+            for i in range(len(batch)):
+                if i < len(parsed) and isinstance(parsed[i], (list, dict)):
+                    results.append(self._to_parts(parsed[i]))
+                else:
+                    results.append(self._parse_evidence_response(""))
+        return results
+    
     def analyze_evidence(self, anomalies: List[Dict[str, Any]], 
                         metrics: Dict[str, Any]) -> List[str]:
         """Generate 3-part evidence analysis."""
-        # Optimized prompt - shorter and more focused
-        prompt = f"""Analyze genomics drift: {anomalies[0]['metric']} (p={anomalies[0]['p']}, effect={anomalies[0]['effect']})
-
-Provide 3 evidence parts:
-1. Statistical: p-values, effect sizes
-2. Clinical: pathogenic variants, coverage  
-3. Technical: pipeline stages, versions
+        prompt = f"""{self._evidence_prompt(anomalies, metrics)}
 
 JSON: ["part1", "part2", "part3"]"""
         
-        response = self.llm.invoke([HumanMessage(content=prompt)])
-        content = response.content
+        content = self._invoke(prompt)
         
-        if "```json" in content:
-            json_start = content.find("```json") + 7
-            json_end = content.find("```", json_start)
-            json_str = content[json_start:json_end].strip()
-            parsed = json.loads(json_str)
-            if isinstance(parsed, dict):
-                # Extract text from dictionary values
-                result = []
-                for value in list(parsed.values())[:3]:
-                    if isinstance(value, dict):
-                        # Extract title or description from nested dict
-                        text = value.get('title', value.get('description', str(value)))
-                        result.append(text)
-                    else:
-                        result.append(str(value))
-                return result
-            return parsed[:3]
-        else:
+        parsed = self._extract_json(content)
+        if parsed is None:
             return self._parse_evidence_response(content)
+        return self._to_parts(parsed)
     
     def analyze_remediation(self, anomalies: List[Dict[str, Any]], 
                            hypotheses: List[Dict[str, Any]]) -> List[str]:
         """Generate 3-part remediation plan."""
-        # Optimized prompt - shorter and more focused
-        prompt = f"""Fix genomics drift: {anomalies[0]['metric']} in {anomalies[0]['stage']}
-
-Provide 3 steps along with 5 lines of demo code output for each in the format of [$ Running remediation protocol... | $ Validating parameters... | ✓ Database version pinned to v101]:
-1. Immediate fix 2 sentences (version pinning, parameters) with code in [] like $ Running remediation protocol... | $ Validating parameters...</div>
-2. Validation 2 sentences  (re-run, compare results)  
-3. Prevention 3 sentences (monitoring, alerts)
+        prompt = f"""{self._remediation_prompt(anomalies, hypotheses)}
 
 JSON: ["step1", "step2", "step3"]"""
         
-        response = self.llm.invoke([HumanMessage(content=prompt)])
-        content = response.content
+        content = self._invoke(prompt)
         
-        if "```json" in content:
-            json_start = content.find("```json") + 7
-            json_end = content.find("```", json_start)
-            json_str = content[json_start:json_end].strip()
-            parsed = json.loads(json_str)
-            if isinstance(parsed, dict):
-                # Extract text from dictionary values
-                result = []
-                for value in list(parsed.values())[:3]:
-                    if isinstance(value, dict):
-                        # Extract title or description from nested dict
-                        text = value.get('title', value.get('description', str(value)))
-                        result.append(text)
-                    else:
-                        result.append(str(value))
-                return result
-            return parsed[:3]
-        else:
+        parsed = self._extract_json(content)
+        if parsed is None:
             return self._parse_remediation_response(content)
+        return self._to_parts(parsed)
     
     def analyze_current_actions(self, case_state: str, 
                                current_step: str) -> List[str]:
         """Generate current action analysis."""
+        prompt = f"""{self._current_actions_prompt(case_state, current_step)}
+
+JSON: ["action1", "action2", "action3"]"""
+        
+        content = self._invoke(prompt)
+        
+        parsed = self._extract_json(content)
+        if parsed is None:
+            return self._parse_current_actions_response(content)
+        return self._to_parts(parsed)
+    
+    def _all_prompt(self, anomalies: List[Dict[str, Any]], metrics: Dict[str, Any],
+                    hypotheses: List[Dict[str, Any]], case_state: str, current_step: str) -> str:
+        """Build the combined three-section prompt."""
+        return f"""Answer all three sections below.
+
+EVIDENCE
+{self._evidence_prompt(anomalies, metrics)}
+
+REMEDIATION
+{self._remediation_prompt(anomalies, hypotheses)}
+
+ACTIONS
+{self._current_actions_prompt(case_state, current_step)}
+
+JSON: {{"evidence": ["part1", "part2", "part3"], "remediation": ["step1", "step2", "step3"], "actions": ["action1", "action2", "action3"]}}"""
+    
+    def _batch_prompt(self, anomalies: List[Dict[str, Any]]) -> str:
+        """Build one evidence prompt covering a list of anomalies."""
+        summaries = "\n".join(
+            f"{i}. {a['metric']} in {a.get('stage', 'unknown')} (p={a['p']}, effect={a['effect']})"
+            for i, a in enumerate(anomalies, 1)
+        )
+        return f"""Analyze genomics drift for each of these {len(anomalies)} anomalies:
+{summaries}
+
+For each anomaly provide 3 evidence parts:
+1. Statistical: p-values, effect sizes
+2. Clinical: pathogenic variants, coverage  
+3. Technical: pipeline stages, versions
+
+JSON: an array of {len(anomalies)} items; item i is ["part1", "part2", "part3"] for anomaly i"""
+    
+    def _evidence_prompt(self, anomalies: List[Dict[str, Any]], metrics: Dict[str, Any]) -> str:
+        """Build the evidence instructions (without the JSON format line)."""
         # Optimized prompt - shorter and more focused
-        prompt = f"""Genomics investigation: {case_state} - {current_step}
+        return f"""Analyze genomics drift: {anomalies[0]['metric']} (p={anomalies[0]['p']}, effect={anomalies[0]['effect']})
+
+Provide 3 evidence parts:
+1. Statistical: p-values, effect sizes
+2. Clinical: pathogenic variants, coverage  
+3. Technical: pipeline stages, versions"""
+    
+    def _remediation_prompt(self, anomalies: List[Dict[str, Any]], hypotheses: List[Dict[str, Any]]) -> str:
+        """Build the remediation instructions (without the JSON format line)."""
+        # Optimized prompt - shorter and more focused
+        return f"""Fix genomics drift: {anomalies[0]['metric']} in {anomalies[0]['stage']}
+
+Provide 3 steps along with 5 lines of demo code output for each in the format of [$ Running remediation protocol... | $ Validating parameters... | ✓ Database version pinned to v101]:
+1. Immediate fix 2 sentences (version pinning, parameters) with code in [] like $ Running remediation protocol... | $ Validating parameters...</div>
+2. Validation 2 sentences  (re-run, compare results)  
+3. Prevention 3 sentences (monitoring, alerts)"""
+    
+    def _current_actions_prompt(self, case_state: str, current_step: str) -> str:
+        """Build the current actions instructions (without the JSON format line)."""
+        # Optimized prompt - shorter and more focused
+        return f"""Genomics investigation: {case_state} - {current_step}
 
 Current actions:
 1. "Fixing: [what is being fixed]"
 2. "Rerunning: [what is being re-executed]"  
-3. "Found: [what was discovered]"
-
-JSON: ["action1", "action2", "action3"]"""
-        
-        response = self.llm.invoke([HumanMessage(content=prompt)])
-        content = response.content
+3. "Found: [what was discovered]\""""
+    
+    def _extract_json(self, content: str) -> Any:
+        """Parse the JSON payload of an LLM response, or None if there isn't one."""
+        # Structured output: the whole response is the JSON document
+        try:
+            parsed = json.loads(content)
+            if isinstance(parsed, (list, dict)):
+                return parsed
+        except json.JSONDecodeError:
+            pass
         
-        if "```json" in content:
-            json_start = content.find("```json") + 7
-            json_end = content.find("```", json_start)
-            json_str = content[json_start:json_end].strip()
-            parsed = json.loads(json_str)
-            if isinstance(parsed, dict):
-                # Extract text from dictionary values
-                result = []
-                for value in list(parsed.values())[:3]:
-                    if isinstance(value, dict):
-                        # Extract title or description from nested dict
-                        text = value.get('title', value.get('description', str(value)))
-                        result.append(text)
-                    else:
-                        result.append(str(value))
-                return result
-            return parsed[:3]
-        else:
-            return self._parse_current_actions_response(content)
+        # Otherwise look for a fenced block, then any embedded object or array
+        match = _JSON_BLOCK.search(content)
+        if match:
+            try:
+                return json.loads(match.group(1))
+            except json.JSONDecodeError:
+                # e.g. a code fence inside a JSON string cut the block short
+                pass
+        return self._parse_fallback(content)
+    
+    def _parse_fallback(self, content: str) -> Any:
+        """Decode the first non-empty JSON object or array anywhere in the content."""
+        start = 0
+        while True:
+            start = min((i for i in (content.find("{", start), content.find("[", start)) if i != -1),
+                        default=-1)
+            if start == -1:
+                return None
+            try:
+                parsed, _ = _JSON_DECODER.raw_decode(content, start)
+                if parsed:
+                    return parsed
+            except json.JSONDecodeError:
+                pass
+            start += 1
+    
+    def _to_parts(self, parsed: Any, limit: int = 3) -> List[str]:
+        """Reduce a parsed JSON list or dict to at most `limit` parts."""
+        if isinstance(parsed, dict):
+            # Extract text from dictionary values
+            return [self._to_part(value) for value in list(parsed.values())[:limit]]
+        return parsed[:limit]
     
+    def _to_part(self, value: Any) -> str:
+        """Render one parsed JSON value as text."""
+        if isinstance(value, dict):
+            # Extract title or description from nested dict
+            return value.get('title', value.get('description', str(value)))
+        return str(value)
     
     def _parse_evidence_response(self, content: str) -> List[str]:
         """Parse evidence response from LLM."""
         # Simple parsing - look for numbered items
-        lines = content.split('\n')
-        evidence = []
-        for line in lines:
-            if line.strip().startswith(('1.', '2.', '3.')):
-                evidence.append(line.strip())
+        evidence = _NUMBERED_LINE.findall(content)
         return evidence[:3] if evidence else ["Evidence part 1: Statistical analysis", "Evidence part 2: Clinical evidence", "Evidence part 3: Technical evidence"]
     
     def _parse_remediation_response(self, content: str) -> List[str]:
         """Parse remediation response from LLM."""
-        lines = content.split('\n')
-        steps = []
-        for line in lines:
-            if line.strip().startswith(('1.', '2.', '3.')):
-                steps.append(line.strip())
+        steps = _NUMBERED_LINE.findall(content)
         return steps[:3] if steps else ["Step 1: Fix issue", "Step 2: Validate", "Step 3: Monitor"]
     
     def _parse_current_actions_response(self, content: str) -> List[str]:
         """Parse current actions response from LLM."""
-        lines = content.split('\n')
-        actions = []
-        for line in lines:
-            if any(prefix in line for prefix in ['Fixing:', 'Rerunning:', 'Found:', 'Execute:']):
-                actions.append(line.strip())
-        return actions[:4] if actions else ["Fixing: Processing", "Rerunning: Analysis", "Found: Results"]
\ No newline at end of file
+        actions = _ACTION_LINE.findall(content)
+        return actions[:4] if actions else ["Fixing: Processing", "Rerunning: Analysis", "Found: Results"]
@@ -3,10 +3,16 @@ LLM bridge for scripted and LLM mode switching.
 Handles text generation and hypothesis ranking with fallback to scripted content.
 """
 import os
+import copy
 import json
-from typing import Dict, List, Any
+import asyncio
+import functools
+import threading
+from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
 from .config import Config
+from .llm_cache import LLMCache
+from . import fast_json
 
 # Optional openai import
 try:
@@ -15,6 +21,72 @@ try:
 except ImportError:
     OPENAI_AVAILABLE = False
 
+# openai's API key is module-global; configure it once per process
+_OPENAI_LOCK = threading.Lock()
+
+def _configure_openai(api_key: str):
+    """Set openai.api_key if it isn't already set to this key."""
+    with _OPENAI_LOCK:
+        if openai.api_key != api_key:
+            openai.api_key = api_key
+
+# Scripted content used when LLM mode is off
+SCRIPTED_FILE = Path("scripts/scripted/annotation_drift.json")
+
+@functools.lru_cache(maxsize=4)
+def _load_scripted(path: str, mtime: float) -> Dict[str, Any]:
+    """Parse a scripted JSON file; mtime is part of the cache key so edits are picked up."""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _scripted_data() -> Optional[Dict[str, Any]]:
+    """Scripted content, or None if the file doesn't exist."""
+    try:
+        mtime = SCRIPTED_FILE.stat().st_mtime
+    except OSError:
+        return None
+    return _load_scripted(str(SCRIPTED_FILE), mtime)
+
+# Static system prompts, identical across calls so provider-side prefix caching applies
+_MESSAGE_SYSTEM = "You are a genomics pipeline investigator agent. Provide concise, technical messages about pipeline drift detection and investigation."
+_RANK_SYSTEM = "You are a genomics expert. Rank hypotheses based on evidence and return JSON."
+_SUMMARY_SYSTEM = "You are a genomics expert. Provide clear, technical summaries of pipeline investigations."
+
+# Candidate fields the ranking prompt needs; anything else is dropped to save tokens
+_CANDIDATE_FIELDS = ("id", "label", "score", "confidence", "signatures")
+
+def _compact_json(obj: Any) -> str:
+    """Serialize for a prompt without whitespace; orjson also takes the NumPy scalars in probe results."""
+    return fast_json.dumps(obj).decode("utf-8")
+
+def _minimal_candidate(candidate: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the hypothesis fields used for ranking."""
+    return {key: candidate[key] for key in _CANDIDATE_FIELDS if key in candidate}
+
+# Per-step LLM prompt templates, formatted with step and context
+_PROMPT_TEMPLATES = {
+    "detect": "Generate a message about drift detection. Context: {context}",
+    "hypothesize": "Generate a message about hypothesis generation. Context: {context}",
+    "plan": "Generate a message about investigation planning. Context: {context}",
+    "probe": "Generate a message about running probes. Context: {context}",
+    "result": "Generate a message about probe results. Context: {context}",
+    "remediate": "Generate a message about remediation. Context: {context}",
+    "validate": "Generate a message about validation. Context: {context}"
+}
+
+_DEFAULT_PROMPT_TEMPLATE = "Generate a message for step: {step}. Context: {context}"
+
+# Fallback messages when the scripted file has no entry for a step
+_FALLBACK_MESSAGES = {
+    "detect": "🔍 Analyzing pipeline metrics for drift...",
+    "hypothesize": "🧠 Generating hypotheses based on anomalies...",
+    "plan": "📋 Planning investigation strategy...",
+    "probe": "🔬 Running counterfactual probe...",
+    "result": "📊 Analyzing probe results...",
+    "remediate": "🔧 Proposing remediation strategy...",
+    "validate": "✅ Validating fix on micro-cohort..."
+}
+
 class LLMBridge:
     """Bridges LLM calls with fallback to scripted content."""
     
@@ -23,9 +95,13 @@ class LLMBridge:
         self.use_llm = os.getenv("USE_LLM", "false").lower() == "true"
         self.api_key = os.getenv("OPENAI_API_KEY", "")
         self.model = os.getenv("LLM_MODEL", "gpt-4o-mini")
+        self.cache = LLMCache()
         
         if self.use_llm and self.api_key and OPENAI_AVAILABLE:
-            openai.api_key = self.api_key
+            _configure_openai(self.api_key)
+        
+        # Parse the scripted content up front so the first request doesn't pay for it
+        _scripted_data()
     
     def get_agent_message(self, step: str, context: Dict[str, Any]) -> str:
         """Get agent message for a given step."""
@@ -50,97 +126,158 @@ class LLMBridge:
         else:
             return self._summarize_scripted(context)
     
+    async def aget_agent_message(self, step: str, context: Dict[str, Any]) -> str:
+        """Async variant of get_agent_message."""
+        if self.use_llm and self.api_key and OPENAI_AVAILABLE:
+            try:
+                content = await self._achat(**self._message_request(step, context))
+                return content.strip()
+            except Exception as e:
+                print(f"⚠ LLM fallback: {e}")
+        return self._get_scripted_message(step, context)
+    
+    async def arank_hypotheses_with_llm(self, anomalies: Dict[str, Any], 
+                                        kg_delta: Dict[str, Any], 
+                                        candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Async variant of rank_hypotheses_with_llm."""
+        if self.use_llm and self.api_key and OPENAI_AVAILABLE:
+            try:
+                content = await self._achat(**self._rank_request(anomalies, kg_delta, candidates))
+                return json.loads(content).get("hypotheses", candidates)
+            except Exception as e:
+                print(f"⚠ LLM fallback: {e}")
+        return self._rank_hypotheses_scripted(anomalies, kg_delta, candidates)
+    
+    async def asummarize_investigation(self, context: Dict[str, Any]) -> str:
+        """Async variant of summarize_investigation."""
+        if self.use_llm and self.api_key and OPENAI_AVAILABLE:
+            try:
+                content = await self._achat(**self._summary_request(context))
+                return content.strip()
+            except Exception as e:
+                print(f"⚠ LLM fallback: {e}")
+        return self._summarize_scripted(context)
+    
+    async def run_step(self, step: str, context: Dict[str, Any]) -> Tuple[str, str]:
+        """Get the agent message and investigation summary for a step concurrently."""
+        message, summary = await asyncio.gather(
+            self.aget_agent_message(step, context),
+            self.asummarize_investigation(context)
+        )
+        return message, summary
+    
     def _get_llm_message(self, step: str, context: Dict[str, Any]) -> str:
         """Generate message using LLM."""
         try:
-            prompt = self._build_prompt(step, context)
-            
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a genomics pipeline investigator agent. Provide concise, technical messages about pipeline drift detection and investigation."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.3
-            )
+            content = self._chat(**self._message_request(step, context))
             
-            return response.choices[0].message.content.strip()
+            return content.strip()
             
         except Exception as e:
             print(f"⚠ LLM fallback: {e}")
             return self._get_scripted_message(step, context)
     
+    def _message_request(self, step: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat request for an agent message."""
+        return {
+            "system": _MESSAGE_SYSTEM,
+            "prompt": self._build_prompt(step, context),
+            "max_tokens": 200,
+            "temperature": 0.3
+        }
+    
+    def _chat(self, system: str, prompt: str, max_tokens: int, temperature: float) -> str:
+        """Run a chat completion, reusing the cached response for identical requests."""
+        messages, key = self._chat_messages(system, prompt, max_tokens, temperature)
+        
+        def call() -> str:
+            response = openai.ChatCompletion.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            return response.choices[0].message.content
+        
+        return self.cache.get_or_call(key, self.model, call)
+    
+    async def _achat(self, system: str, prompt: str, max_tokens: int, temperature: float) -> str:
+        """Async chat completion, reusing the cached response for identical requests."""
+        messages, key = self._chat_messages(system, prompt, max_tokens, temperature)
+        
+        async def call() -> str:
+            response = await openai.ChatCompletion.acreate(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            return response.choices[0].message.content
+        
+        return await self.cache.aget_or_call(key, self.model, call)
+    
+    def _chat_messages(self, system: str, prompt: str, max_tokens: int,
+                       temperature: float) -> Tuple[List[Dict[str, str]], str]:
+        """Build chat messages and their cache key."""
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+        return messages, LLMCache.make_key(self.model, temperature, messages, max_tokens=max_tokens)
+    
     def _get_scripted_message(self, step: str, context: Dict[str, Any]) -> str:
         """Get scripted message for step."""
-        scripted_file = Path("scripts/scripted/annotation_drift.json")
+        scripted_data = _scripted_data()
         
-        if scripted_file.exists():
-            with open(scripted_file, 'r') as f:
-                scripted_data = json.load(f)
-            
+        if scripted_data is not None:
             agent_log = scripted_data.get("agent_log", [])
             for entry in agent_log:
                 if entry.get("step") == step:
                     return entry.get("msg", f"Processing {step}...")
         
-        # Fallback messages
-        fallback_messages = {
-            "detect": "🔍 Analyzing pipeline metrics for drift...",
-            "hypothesize": "🧠 Generating hypotheses based on anomalies...",
-            "plan": "📋 Planning investigation strategy...",
-            "probe": "🔬 Running counterfactual probe...",
-            "result": "📊 Analyzing probe results...",
-            "remediate": "🔧 Proposing remediation strategy...",
-            "validate": "✅ Validating fix on micro-cohort..."
-        }
-        
-        return fallback_messages.get(step, f"Processing {step}...")
+        return _FALLBACK_MESSAGES.get(step, f"Processing {step}...")
     
     def _rank_hypotheses_llm(self, anomalies: Dict[str, Any], 
                            kg_delta: Dict[str, Any], 
                            candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Rank hypotheses using LLM."""
         try:
-            prompt = f"""
-            Rank these hypotheses for genomics pipeline drift:
-            
-            Anomalies: {json.dumps(anomalies, indent=2)}
-            Knowledge Graph Changes: {json.dumps(kg_delta, indent=2)}
-            Candidate Hypotheses: {json.dumps(candidates, indent=2)}
-            
-            Return JSON with ranked hypotheses including confidence scores.
-            """
-            
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a genomics expert. Rank hypotheses based on evidence and return JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.2
-            )
+            content = self._chat(**self._rank_request(anomalies, kg_delta, candidates))
             
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(content)
             return result.get("hypotheses", candidates)
             
         except Exception as e:
             print(f"⚠ LLM fallback: {e}")
             return self._rank_hypotheses_scripted(anomalies, kg_delta, candidates)
     
+    def _rank_request(self, anomalies: Dict[str, Any], kg_delta: Dict[str, Any],
+                      candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Chat request for hypothesis ranking."""
+        prompt = (
+            "Rank these hypotheses for genomics pipeline drift:\n\n"
+            f"Anomalies: {_compact_json(anomalies)}\n"
+            f"Knowledge Graph Changes: {_compact_json(kg_delta)}\n"
+            f"Candidate Hypotheses: {_compact_json([_minimal_candidate(c) for c in candidates])}\n\n"
+            "Return JSON with ranked hypotheses including confidence scores."
+        )
+        return {
+            "system": _RANK_SYSTEM,
+            "prompt": prompt,
+            "max_tokens": 500,
+            "temperature": 0.2
+        }
+    
     def _rank_hypotheses_scripted(self, anomalies: Dict[str, Any], 
                                 kg_delta: Dict[str, Any], 
                                 candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Rank hypotheses using scripted logic."""
         # Load scripted hypotheses
-        scripted_file = Path("scripts/scripted/annotation_drift.json")
+        scripted_data = _scripted_data()
         
-        if scripted_file.exists():
-            with open(scripted_file, 'r') as f:
-                scripted_data = json.load(f)
-            
-            return scripted_data.get("hypotheses", candidates)
+        if scripted_data is not None:
+            # Copy so callers can't mutate the cached content
+            return copy.deepcopy(scripted_data.get("hypotheses", candidates))
         
         # Fallback to simple ranking
         return candidates
@@ -148,52 +285,38 @@ class LLMBridge:
     def _summarize_llm(self, context: Dict[str, Any]) -> str:
         """Generate summary using LLM."""
         try:
-            prompt = f"""
-            Summarize this genomics pipeline investigation:
+            content = self._chat(**self._summary_request(context))
             
-            Context: {json.dumps(context, indent=2)}
-            
-            Provide a concise summary including root cause, evidence, and resolution.
-            """
-            
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a genomics expert. Provide clear, technical summaries of pipeline investigations."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.3
-            )
-            
-            return response.choices[0].message.content.strip()
+            return content.strip()
             
         except Exception as e:
             print(f"⚠ LLM fallback: {e}")
             return self._summarize_scripted(context)
     
+    def _summary_request(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat request for an investigation summary."""
+        prompt = (
+            "Summarize this genomics pipeline investigation:\n\n"
+            f"Context: {_compact_json(context)}\n\n"
+            "Provide a concise summary including root cause, evidence, and resolution."
+        )
+        return {
+            "system": _SUMMARY_SYSTEM,
+            "prompt": prompt,
+            "max_tokens": 300,
+            "temperature": 0.3
+        }
+    
     def _summarize_scripted(self, context: Dict[str, Any]) -> str:
         """Generate scripted summary."""
-        scripted_file = Path("scripts/scripted/annotation_drift.json")
+        scripted_data = _scripted_data()
         
-        if scripted_file.exists():
-            with open(scripted_file, 'r') as f:
-                scripted_data = json.load(f)
-            
+        if scripted_data is not None:
             return scripted_data.get("summary", "Investigation completed.")
         
         return "Investigation completed with scripted fallback."
     
     def _build_prompt(self, step: str, context: Dict[str, Any]) -> str:
         """Build prompt for LLM based on step and context."""
-        prompts = {
-            "detect": f"Generate a message about drift detection. Context: {context}",
-            "hypothesize": f"Generate a message about hypothesis generation. Context: {context}",
-            "plan": f"Generate a message about investigation planning. Context: {context}",
-            "probe": f"Generate a message about running probes. Context: {context}",
-            "result": f"Generate a message about probe results. Context: {context}",
-            "remediate": f"Generate a message about remediation. Context: {context}",
-            "validate": f"Generate a message about validation. Context: {context}"
-        }
-        
-        return prompts.get(step, f"Generate a message for step: {step}. Context: {context}")
\ No newline at end of file
+        template = _PROMPT_TEMPLATES.get(step, _DEFAULT_PROMPT_TEMPLATE)
+        return template.format(step=step, context=context)
\ No newline at end of file
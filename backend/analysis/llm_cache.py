@@ -0,0 +1,109 @@
+"""
+Exact-match response cache for LLM calls.
+Keys on model, sampling parameters and the full prompt; persists response text in SQLite.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pathlib import Path
+from .db_pool import SQLitePool
+
+class LLMCache:
+    """Content-addressed cache of LLM responses, shared across processes via SQLite."""
+
+    def __init__(self, db_path: Optional[str] = "db/metrics.duckdb"):
+        # LLM_CACHE=0 bypasses the cache entirely
+        self.enabled = os.getenv("LLM_CACHE", "1") != "0"
+        self._memory: Dict[str, str] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._async_locks: Dict[str, asyncio.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+        self._pool = None
+        if self.enabled and db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._pool = SQLitePool(db_path, min_size=1, max_size=2)
+            with self._pool.get_connection() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        model TEXT,
+                        response TEXT,
+                        created REAL
+                    )
+                """)
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: List[Dict[str, str]], **params: Any) -> str:
+        """Hash everything that determines the response; any prompt or model change is a new key."""
+        payload = json.dumps(
+            {"model": model, "temperature": temperature, "messages": messages, **params},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=32).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a cached response."""
+        if not self.enabled:
+            return None
+
+        response = self._memory.get(key)
+        if response is None and self._pool is not None:
+            with self._pool.get_connection() as conn:
+                row = conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                response = self._memory[key] = row[0]
+        return response
+
+    def set(self, key: str, model: str, response: str):
+        """Store a response."""
+        if not self.enabled:
+            return
+
+        self._memory[key] = response
+        if self._pool is not None:
+            with self._pool.get_connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, response, created) VALUES (?, ?, ?, ?)",
+                    (key, model, response, time.time())
+                )
+
+    def get_or_call(self, key: str, model: str, call: Callable[[], str]) -> str:
+        """Return the cached response for key, or run call() once and cache its result."""
+        if not self.enabled:
+            return call()
+
+        response = self.get(key)
+        if response is not None:
+            return response
+
+        # Concurrent identical requests wait for the first one instead of all hitting the API
+        with self._locks_guard:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            response = self.get(key)
+            if response is None:
+                response = call()
+                self.set(key, model, response)
+        return response
+
+    async def aget_or_call(self, key: str, model: str, call: Callable[[], Awaitable[str]]) -> str:
+        """Async get_or_call; concurrent identical coroutines share one API call."""
+        if not self.enabled:
+            return await call()
+
+        response = self.get(key)
+        if response is not None:
+            return response
+
+        key_lock = self._async_locks.setdefault(key, asyncio.Lock())
+        async with key_lock:
+            response = self.get(key)
+            if response is None:
+                response = await call()
+                self.set(key, model, response)
+        return response
@@ -1,54 +1,66 @@
 """
 Statistical metrics for genomics pipeline monitoring.
-All functions use fixed seeds for deterministic results.
+All functions are deterministic and leave the global NumPy RNG untouched.
 """
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from scipy import stats
-from typing import List, Dict, Any
+from scipy.special import rel_entr
+from typing import List, Dict, Any, Optional
 import json
 
-# Set seed for deterministic results
-np.random.seed(42)
-
 def ks_test(current: List[float], baseline: List[float]) -> Dict[str, float]:
     """Kolmogorov-Smirnov test between current and baseline distributions."""
-    if len(current) == 0 or len(baseline) == 0:
+    current = np.asarray(current, dtype=np.float64)
+    baseline = np.asarray(baseline, dtype=np.float64)
+    if current.size == 0 or baseline.size == 0:
         return {"statistic": 0.0, "p_value": 1.0}
     
     statistic, p_value = stats.ks_2samp(current, baseline)
     return {"statistic": float(statistic), "p_value": float(p_value)}
 
+# Share of ClinVar calls labelled pathogenic above which annotation counts are flagged as drifted
+PATHOGENIC_DRIFT_THRESHOLD = 0.15
+
+def check_pathogenic_drift(counts: np.ndarray, path_idx: int = 0,
+                           threshold: float = PATHOGENIC_DRIFT_THRESHOLD) -> np.ndarray:
+    """Flag each row of an (N runs x K labels) count matrix whose pathogenic share exceeds threshold."""
+    counts = np.atleast_2d(np.asarray(counts, dtype=np.float64))
+    totals = counts.sum(axis=1)
+    return counts[:, path_idx] / np.maximum(totals, 1) > threshold
+
 def chi2_test(current_counts: Dict[str, int], baseline_counts: Dict[str, int]) -> Dict[str, float]:
     """Chi-squared test for categorical data."""
-    # Get all categories
-    all_cats = set(current_counts.keys()) | set(baseline_counts.keys())
+    # Get all categories in a stable order
+    cats = sorted(current_counts.keys() | baseline_counts.keys())
     
     # Create contingency table
-    current_vals = [current_counts.get(cat, 0) for cat in all_cats]
-    baseline_vals = [baseline_counts.get(cat, 0) for cat in all_cats]
+    current_vals = np.fromiter((current_counts.get(cat, 0) for cat in cats), dtype=np.int64, count=len(cats))
+    baseline_vals = np.fromiter((baseline_counts.get(cat, 0) for cat in cats), dtype=np.int64, count=len(cats))
     
-    if sum(current_vals) == 0 or sum(baseline_vals) == 0:
+    current_total = current_vals.sum()
+    baseline_total = baseline_vals.sum()
+    if current_total == 0 or baseline_total == 0:
         return {"statistic": 0.0, "p_value": 1.0}
     
-    # Normalize to proportions
-    current_props = np.array(current_vals) / sum(current_vals)
-    baseline_props = np.array(baseline_vals) / sum(baseline_vals)
-    
-    # Chi-squared test
-    statistic, p_value = stats.chisquare(current_props, baseline_props)
+    # Observed counts against baseline frequencies scaled to the current sample size
+    expected = baseline_vals * (current_total / baseline_total)
+    statistic, p_value = stats.chisquare(current_vals, f_exp=expected)
     return {"statistic": float(statistic), "p_value": float(p_value)}
 
-def psi(current: List[float], baseline: List[float], bins: int = 10) -> float:
-    """Population Stability Index between current and baseline distributions."""
-    if len(current) == 0 or len(baseline) == 0:
-        return 0.0
+def _binned_props(current: List[float], baseline: List[float], bins: int):
+    """Histogram both samples on shared bins; returns (current_props, baseline_props) or None."""
+    current = np.asarray(current, dtype=np.float64)
+    baseline = np.asarray(baseline, dtype=np.float64)
+    if current.size == 0 or baseline.size == 0:
+        return None
     
-    # Create bins based on baseline
-    min_val = min(min(current), min(baseline))
-    max_val = max(max(current), max(baseline))
+    # Shared bin range, one reduction per array
+    min_val = min(current.min(), baseline.min())
+    max_val = max(current.max(), baseline.max())
     
     if min_val == max_val:
-        return 0.0
+        return None
     
     bin_edges = np.linspace(min_val, max_val, bins + 1)
     
@@ -57,88 +69,102 @@ def psi(current: List[float], baseline: List[float], bins: int = 10) -> float:
     baseline_hist, _ = np.histogram(baseline, bins=bin_edges)
     
     # Normalize to proportions
-    current_props = current_hist / (sum(current_hist) + 1e-10)
-    baseline_props = baseline_hist / (sum(baseline_hist) + 1e-10)
+    current_props = current_hist / (current_hist.sum() + 1e-10)
+    baseline_props = baseline_hist / (baseline_hist.sum() + 1e-10)
+    return current_props, baseline_props
+
+def psi(current: List[float], baseline: List[float], bins: int = 10) -> float:
+    """Population Stability Index between current and baseline distributions."""
+    props = _binned_props(current, baseline, bins)
+    if props is None:
+        return 0.0
+    current_props, baseline_props = props
     
-    # Calculate PSI
-    psi_val = 0.0
-    for i in range(len(current_props)):
-        if baseline_props[i] > 0:
-            psi_val += (current_props[i] - baseline_props[i]) * np.log(current_props[i] / baseline_props[i])
+    # Calculate PSI over bins populated in the baseline; empty current bins contribute 0
+    mask = baseline_props > 0
+    current_props, baseline_props = current_props[mask], baseline_props[mask]
+    ratio = np.divide(current_props, baseline_props, out=np.ones_like(current_props),
+                      where=current_props > 0)
+    psi_val = np.sum((current_props - baseline_props) * np.log(ratio))
     
     return float(psi_val)
 
 def js_divergence(current: List[float], baseline: List[float], bins: int = 10) -> float:
     """Jensen-Shannon divergence between current and baseline distributions."""
-    if len(current) == 0 or len(baseline) == 0:
-        return 0.0
-    
-    # Create bins
-    min_val = min(min(current), min(baseline))
-    max_val = max(max(current), max(baseline))
-    
-    if min_val == max_val:
+    props = _binned_props(current, baseline, bins)
+    if props is None:
         return 0.0
+    current_props, baseline_props = props
     
-    bin_edges = np.linspace(min_val, max_val, bins + 1)
-    
-    # Calculate histograms
-    current_hist, _ = np.histogram(current, bins=bin_edges)
-    baseline_hist, _ = np.histogram(baseline, bins=bin_edges)
-    
-    # Normalize to proportions
-    current_props = current_hist / (sum(current_hist) + 1e-10)
-    baseline_props = baseline_hist / (sum(baseline_hist) + 1e-10)
-    
-    # Calculate JS divergence
+    # Calculate JS divergence; rel_entr(0, m) is 0, and m > 0 wherever either input is
     m = 0.5 * (current_props + baseline_props)
-    js_val = 0.5 * stats.entropy(current_props, m) + 0.5 * stats.entropy(baseline_props, m)
+    js_val = 0.5 * rel_entr(current_props, m).sum() + 0.5 * rel_entr(baseline_props, m).sum()
     
     return float(js_val)
 
 def ece_score(y_true: List[int], y_pred: List[float], n_bins: int = 10) -> float:
     """Expected Calibration Error for prediction calibration."""
-    if len(y_true) == 0 or len(y_pred) == 0:
+    # Probabilities and 0/1 labels need no more than float32
+    y_true = np.asarray(y_true, dtype=np.float32)
+    y_pred = np.asarray(y_pred, dtype=np.float32)
+    if y_true.size == 0 or y_pred.size == 0:
         return 0.0
     
-    y_true = np.array(y_true)
-    y_pred = np.array(y_pred)
+    # Bin index for (lower, upper] bins; values outside (0, 1] fall in no bin
+    # float32 edges so edge values compare equal to float32 predictions
+    bin_boundaries = np.linspace(0, 1, n_bins + 1, dtype=np.float32)
+    idx = np.searchsorted(bin_boundaries, y_pred, side="left") - 1
+    in_range = (idx >= 0) & (idx < n_bins)
+    idx = idx[in_range]
     
-    # Create bins
-    bin_boundaries = np.linspace(0, 1, n_bins + 1)
-    bin_lowers = bin_boundaries[:-1]
-    bin_uppers = bin_boundaries[1:]
-    
-    ece = 0.0
-    for bin_lower, bin_upper in zip(bin_lowers, bin_uppers):
-        in_bin = (y_pred > bin_lower) & (y_pred <= bin_upper)
-        prop_in_bin = in_bin.mean()
-        
-        if prop_in_bin > 0:
-            accuracy_in_bin = y_true[in_bin].mean()
-            avg_confidence_in_bin = y_pred[in_bin].mean()
-            ece += abs(avg_confidence_in_bin - accuracy_in_bin) * prop_in_bin
+    # Per-bin confidence and accuracy sums in one pass each;
+    # |avg_conf - acc| * (count / N) reduces to |sum_conf - sum_acc| / N
+    sum_conf = np.bincount(idx, weights=y_pred[in_range], minlength=n_bins)
+    sum_acc = np.bincount(idx, weights=y_true[in_range], minlength=n_bins)
+    ece = np.abs(sum_conf - sum_acc).sum() / y_pred.size
     
     return float(ece)
 
 def brier_score(y_true: List[int], y_pred: List[float]) -> float:
     """Brier score for prediction quality."""
-    if len(y_true) == 0 or len(y_pred) == 0:
+    y_true = np.asarray(y_true, dtype=np.float32)
+    y_pred = np.asarray(y_pred, dtype=np.float32)
+    if y_true.size == 0 or y_pred.size == 0:
         return 0.0
     
-    y_true = np.array(y_true)
-    y_pred = np.array(y_pred)
-    
-    return float(np.mean((y_pred - y_true) ** 2))
+    return float(np.mean((y_pred - y_true) ** 2, dtype=np.float32))
 
 def calculate_median_iqr(data: List[float]) -> Dict[str, float]:
     """Calculate median and IQR for a dataset."""
-    if len(data) == 0:
+    data = np.asarray(data, dtype=np.float64)
+    if data.size == 0:
         return {"median": 0.0, "iqr": 0.0}
     
-    data = np.array(data)
-    median = np.median(data)
-    q75, q25 = np.percentile(data, [75, 25])
-    iqr = q75 - q25
+    # One selection pass for all three order statistics
+    q25, median, q75 = np.quantile(data, (0.25, 0.5, 0.75))
     
-    return {"median": float(median), "iqr": float(iqr)}
\ No newline at end of file
+    return {"median": float(median), "iqr": float(q75 - q25)}
+
+def compute_all_metrics(current: List[float], baseline: List[float],
+                        y_true: Optional[List[int]] = None,
+                        y_pred: Optional[List[float]] = None) -> Dict[str, Any]:
+    """Compute the distribution (and, given labels, calibration) metrics concurrently."""
+    # Convert once up front; the worker threads share the arrays read-only
+    current = np.asarray(current, dtype=np.float64)
+    baseline = np.asarray(baseline, dtype=np.float64)
+    
+    # NumPy/SciPy release the GIL inside their kernels, so the metrics overlap
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = {
+            "ks": executor.submit(ks_test, current, baseline),
+            "psi": executor.submit(psi, current, baseline),
+            "js_divergence": executor.submit(js_divergence, current, baseline),
+            "median_iqr": executor.submit(calculate_median_iqr, current)
+        }
+        if y_true is not None and y_pred is not None:
+            y_true = np.asarray(y_true, dtype=np.float32)
+            y_pred = np.asarray(y_pred, dtype=np.float32)
+            futures["ece"] = executor.submit(ece_score, y_true, y_pred)
+            futures["brier"] = executor.submit(brier_score, y_true, y_pred)
+        
+        return {name: future.result() for name, future in futures.items()}
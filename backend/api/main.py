@@ -3,38 +3,37 @@ FastAPI main application for GIA system.
 Implements all required endpoints with proper error handling.
 """
 import os
-import json
 import uuid
 import time
+import atexit
+import asyncio
+import json
 import hashlib
+import threading
 from datetime import datetime
+from functools import lru_cache, wraps
 from pathlib import Path
 from typing import Dict, List, Any, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import uvicorn
 
 from .schemas import (
     RunRequest, RunResponse, CheckDriftRequest, CheckDriftResponse,
     NextProbeRequest, NextProbeResponse, RunProbeRequest, ProbeResult,
     RemediateRequest, RemediateResponse, SummaryRequest, SummaryResponse,
-    EventLog, InvestigationState, LLMAnalysis
+    EventLog, InvestigationState, LLMAnalysis, construct_trusted, shallow_dict
 )
 
 # Import analysis modules
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
 
-from analysis.pipeline import align, call_variants, annotate, predict
-from analysis.detectors import DriftDetector
-from analysis.kg import KnowledgeGraph
-from analysis.hypotheses import HypothesisRanker
-from analysis.probes import CounterfactualProbes
-from analysis.report import RemediationEngine
-from analysis.llm_bridge import LLMBridge
-from analysis.llm_analysis import LLMAnalyzer
 from analysis.config import Config
+from analysis import fast_json
+from .state import LRUStore, SnapshotWriter
 
 app = FastAPI(title="Genomics Investigator Agent", version="1.0.0")
 
@@ -47,23 +46,132 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize components
-detector = DriftDetector()
-kg_builder = KnowledgeGraph()
-hypothesis_ranker = HypothesisRanker()
-probes = CounterfactualProbes()
-remediation = RemediationEngine()
-llm_bridge = LLMBridge()
-llm_analyzer = LLMAnalyzer()
 config = Config()
 
-# In-memory state storage (in production, use database)
-investigations = {}
-run_artifacts = {}
+# next_probe cycles through probes in priority order
+_PROBE_CYCLE = tuple(config.probe_priorities)
+_PROBE_N = len(_PROBE_CYCLE)
+
+def _lazy_component(build):
+    """Build a shared component on its first use instead of at app import; thread-safe."""
+    instance = []
+    lock = threading.Lock()
+    
+    @wraps(build)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(build())
+        return instance[0]
+    return get
+
+# Heavy analysis modules (numpy, networkx, matplotlib, LLM clients) load with the first request that needs them
+@_lazy_component
+def _detector():
+    from analysis.detectors import DriftDetector
+    return DriftDetector()
+
+@_lazy_component
+def _kg_builder():
+    from analysis.kg import KnowledgeGraph
+    return KnowledgeGraph()
+
+@_lazy_component
+def _hypothesis_ranker():
+    from analysis.hypotheses import HypothesisRanker
+    return HypothesisRanker()
+
+@_lazy_component
+def _probes():
+    from analysis.probes import CounterfactualProbes
+    return CounterfactualProbes()
+
+@_lazy_component
+def _remediation():
+    from analysis.report import RemediationEngine
+    return RemediationEngine()
+
+@_lazy_component
+def _llm_bridge():
+    from analysis.llm_bridge import LLMBridge
+    return LLMBridge()
+
+@_lazy_component
+def _llm_analyzer():
+    from analysis.llm_analysis import LLMAnalyzer
+    return LLMAnalyzer()
+
+# In-memory state, bounded to the most recently used entries and snapshotted to disk
+STATE_DIR = Path("runs") / "_state"
+STATE_MAX_ENTRIES = int(os.getenv("GIA_STATE_MAX_ENTRIES", "1024"))
+STATE_SNAPSHOT_INTERVAL_S = 30
+
+investigations = LRUStore(maxsize=STATE_MAX_ENTRIES)
+run_artifacts = LRUStore(maxsize=STATE_MAX_ENTRIES)
+
+_investigations_snapshot = SnapshotWriter(STATE_DIR / "investigations.json", encode=lambda case: case.dict())
+_run_artifacts_snapshot = SnapshotWriter(STATE_DIR / "run_artifacts.json")
+
+async def _snapshot_state():
+    """Write changed state snapshots; encoding runs on the event loop so handlers can't mutate mid-encode."""
+    for writer, store in ((_investigations_snapshot, investigations), (_run_artifacts_snapshot, run_artifacts)):
+        data = writer.serialize(store)
+        if data is not None:
+            await run_in_threadpool(writer.write, data)
+
+async def _snapshot_state_loop():
+    """Periodically persist state until the app shuts down."""
+    while True:
+        await asyncio.sleep(STATE_SNAPSHOT_INTERVAL_S)
+        try:
+            await _snapshot_state()
+        except Exception as e:
+            print(f"⚠ State snapshot failed: {e}")
+
+@app.on_event("startup")
+async def _restore_state():
+    """Rehydrate state from the last snapshot and start periodic snapshots."""
+    _investigations_snapshot.load(investigations, decode=lambda data: InvestigationState(**data))
+    _run_artifacts_snapshot.load(run_artifacts)
+    app.state.snapshot_task = asyncio.create_task(_snapshot_state_loop())
+
+@app.on_event("shutdown")
+async def _save_state():
+    """Stop periodic snapshots and write a final one."""
+    task = getattr(app.state, "snapshot_task", None)
+    if task is not None:
+        task.cancel()
+    await _snapshot_state()
+
+# kg_builder is shared by all runs; concurrent requests build into it one at a time
+_kg_lock = threading.Lock()
+
+def _build_run_kg(run_id: str, request: RunRequest, vcf_path: str, vcf_simulated: bool, run_dir: Path) -> str:
+    """Add a run's nodes and edges to the knowledge graph and save it; returns the kg.json path."""
+    kg_builder = _kg_builder()
+    with _kg_lock:
+        kg_builder.add_run_node(run_id, {"sample_id": request.sample_id})
+        ref_node = kg_builder.add_reference_node(request.reference)
+        aligner_node = kg_builder.add_aligner_node("bwa")
+        caller_node = kg_builder.add_caller_node(request.caller_tag)
+        vcf_node = kg_builder.add_vcf_node(vcf_path, vcf_simulated)
+        annotator_node = kg_builder.add_annotator_node(request.annotator, request.db_version)
+        
+        # Add edges
+        kg_builder.add_edge(f"run_{run_id}", ref_node, "uses")
+        kg_builder.add_edge(f"run_{run_id}", aligner_node, "uses")
+        kg_builder.add_edge(aligner_node, vcf_node, "produced_by")
+        kg_builder.add_edge(caller_node, vcf_node, "produced_by")
+        kg_builder.add_edge(annotator_node, vcf_node, "uses")
+        
+        # Save knowledge graph
+        return kg_builder.save_graph(run_id, str(run_dir))
 
 @app.post("/api/run", response_model=RunResponse)
-async def run_pipeline(request: RunRequest):
+async def run_pipeline(request: RunRequest, background_tasks: BackgroundTasks):
     """Run genomics pipeline and return artifacts."""
+    from analysis.pipeline import align, call_variants, annotate, predict
     run_id = f"run_{uuid.uuid4().hex[:8]}"
     start_time = time.time()
     
@@ -72,25 +180,33 @@ async def run_pipeline(request: RunRequest):
         run_dir = Path("runs") / run_id
         run_dir.mkdir(parents=True, exist_ok=True)
         
-        # Run pipeline stages
-        bam_path, align_metrics = align(
-            str(request.fq1_path), str(request.fq2_path), str(request.reference), 
+        # Run pipeline stages in worker threads so the event loop keeps serving requests
+        bam_path, align_metrics = await run_in_threadpool(
+            align, str(request.fq1_path), str(request.fq2_path), str(request.reference), 
             str(run_dir / "align")
         )
         
-        vcf_path, call_metrics = call_variants(
-            bam_path, str(request.reference), str(request.caller_tag), 
-            str(run_dir / "call")
+        vcf_path, call_metrics = await run_in_threadpool(
+            call_variants, bam_path, str(request.reference), str(request.caller_tag), 
+            str(run_dir / "call"), simulated=align_metrics.get("simulated", False)
         )
+        vcf_simulated = call_metrics.get("simulated", False)
         
-        annot_vcf, annot_metrics = annotate(
-            vcf_path, str(request.annotator), str(request.db_version), 
-            str(request.transcript_policy), str(run_dir / "annotate")
-        )
+        async def annotate_and_predict():
+            annot_vcf, annot_metrics = await run_in_threadpool(
+                annotate, vcf_path, str(request.annotator), str(request.db_version), 
+                str(request.transcript_policy), str(run_dir / "annotate"), simulated=vcf_simulated
+            )
+            predictions, pred_metrics = await run_in_threadpool(
+                predict, annot_vcf, "models/pathogenicity_model.pkl", {}, 
+                str(run_dir / "predict")
+            )
+            return annot_vcf, annot_metrics, predictions, pred_metrics
         
-        predictions, pred_metrics = predict(
-            annot_vcf, "models/pathogenicity_model.pkl", {}, 
-            str(run_dir / "predict")
+        # The knowledge graph only needs the VCF, so build it alongside annotation/prediction
+        (annot_vcf, annot_metrics, predictions, pred_metrics), kg_file = await asyncio.gather(
+            annotate_and_predict(),
+            run_in_threadpool(_build_run_kg, run_id, request, vcf_path, vcf_simulated, run_dir)
         )
         
         # Store metrics
@@ -102,26 +218,7 @@ async def run_pipeline(request: RunRequest):
         }
         
         metrics_file = run_dir / "metrics.json"
-        with open(metrics_file, 'w') as f:
-            json.dump(all_metrics, f, indent=2)
-        
-        # Build knowledge graph
-        kg_builder.add_run_node(run_id, {"sample_id": request.sample_id})
-        ref_node = kg_builder.add_reference_node(request.reference)
-        aligner_node = kg_builder.add_aligner_node("bwa")
-        caller_node = kg_builder.add_caller_node(request.caller_tag)
-        vcf_node = kg_builder.add_vcf_node(vcf_path)
-        annotator_node = kg_builder.add_annotator_node(request.annotator, request.db_version)
-        
-        # Add edges
-        kg_builder.add_edge(f"run_{run_id}", ref_node, "uses")
-        kg_builder.add_edge(f"run_{run_id}", aligner_node, "uses")
-        kg_builder.add_edge(aligner_node, vcf_node, "produced_by")
-        kg_builder.add_edge(caller_node, vcf_node, "produced_by")
-        kg_builder.add_edge(annotator_node, vcf_node, "uses")
-        
-        # Save knowledge graph
-        kg_file = kg_builder.save_graph(run_id, str(run_dir))
+        fast_json.dump(all_metrics, metrics_file, indent=True)
         
         # Store run artifacts
         run_artifacts[run_id] = {
@@ -136,8 +233,8 @@ async def run_pipeline(request: RunRequest):
         
         # Log event
         duration_ms = int((time.time() - start_time) * 1000)
-        log_event(run_id, "run_pipeline", {"request": request.dict()}, 
-                 f"Pipeline completed successfully", duration_ms)
+        background_tasks.add_task(log_event, run_id, "run_pipeline", {"request": shallow_dict(request)}, 
+                                  f"Pipeline completed successfully", duration_ms)
         
         return RunResponse(
             run_id=run_id,
@@ -152,8 +249,12 @@ async def run_pipeline(request: RunRequest):
                  f"Pipeline failed: {str(e)}", duration_ms)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _json_response(content: Dict[str, Any]) -> Response:
+    """Serialize a trusted response body ourselves instead of re-validating it against response_model."""
+    return Response(content=fast_json.dumps(content), media_type="application/json")
+
 @app.post("/api/check_drift", response_model=CheckDriftResponse)
-async def check_drift(request: CheckDriftRequest):
+async def check_drift(request: CheckDriftRequest, background_tasks: BackgroundTasks):
     """Check for drift in pipeline metrics."""
     start_time = time.time()
     
@@ -163,14 +264,10 @@ async def check_drift(request: CheckDriftRequest):
             raise HTTPException(status_code=404, detail="Run not found")
         
         metrics_file = run_artifacts[request.run_id]["metrics_file"]
-        with open(metrics_file, 'r') as f:
-            metrics = json.load(f)
+        metrics = fast_json.load(metrics_file)
         
-        # Detect drift for each stage
-        all_anomalies = []
-        for stage, stage_metrics in metrics.items():
-            anomalies = detector.detect_drift(request.run_id, stage, stage_metrics)
-            all_anomalies.extend(anomalies)
+        # Detect drift for all stages in one batch; SQLite and NumPy work runs in a worker thread
+        all_anomalies = await run_in_threadpool(_detector().detect_drift_batch, request.run_id, metrics)
         
         # Determine if investigation should be opened
         open_investigation = len(all_anomalies) > 0
@@ -179,35 +276,40 @@ async def check_drift(request: CheckDriftRequest):
         
         if open_investigation:
             case_id = f"case_{uuid.uuid4().hex[:8]}"
-            investigations[case_id] = InvestigationState(
+            investigations[case_id] = construct_trusted(
+                InvestigationState,
                 case_id=case_id,
                 state="DETECT",
                 anomalies=all_anomalies
             )
             
             # Generate LLM analysis
+            llm_analyzer = _llm_analyzer()
             print(f"🧠 {llm_analyzer.get_model_info()}")
-            evidence_parts = llm_analyzer.analyze_evidence(all_anomalies, metrics)
-            remediation_parts = llm_analyzer.analyze_remediation(all_anomalies, [])
-            current_actions = llm_analyzer.analyze_current_actions("DETECT", "drift_analysis")
+            # One request for all three sections
+            analysis = await run_in_threadpool(
+                llm_analyzer.analyze_all, all_anomalies, metrics, [], "DETECT", "drift_analysis"
+            )
             
-            llm_analysis = LLMAnalysis(
-                evidence_parts=evidence_parts,
-                remediation_parts=remediation_parts,
-                current_actions=current_actions
+            llm_analysis = construct_trusted(
+                LLMAnalysis,
+                evidence_parts=analysis["evidence"],
+                remediation_parts=analysis["remediation"],
+                current_actions=analysis["actions"]
             )
         
         # Log event
         duration_ms = int((time.time() - start_time) * 1000)
-        log_event(request.run_id, "check_drift", {"baseline": request.baseline}, 
-                 f"Found {len(all_anomalies)} anomalies", duration_ms)
-        
-        return CheckDriftResponse(
-            anomalies=all_anomalies,
-            open_investigation=open_investigation,
-            case_id=case_id,
-            llm_analysis=llm_analysis
-        )
+        background_tasks.add_task(log_event, request.run_id, "check_drift", {"baseline": request.baseline}, 
+                                  f"Found {len(all_anomalies)} anomalies", duration_ms)
+        
+        # Encoded directly; the fields match CheckDriftResponse
+        return _json_response({
+            "anomalies": all_anomalies,
+            "open_investigation": open_investigation,
+            "case_id": case_id,
+            "llm_analysis": shallow_dict(llm_analysis) if llm_analysis else None
+        })
         
     except Exception as e:
         duration_ms = int((time.time() - start_time) * 1000)
@@ -215,8 +317,43 @@ async def check_drift(request: CheckDriftRequest):
                  f"Drift check failed: {str(e)}", duration_ms)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/analysis/stream")
+async def stream_analysis(case_id: str):
+    """Stream LLM analysis for a case as Server-Sent Events."""
+    if case_id not in investigations:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    case = investigations[case_id]
+    if not case.anomalies:
+        raise HTTPException(status_code=400, detail="Case has no anomalies")
+    
+    def events():
+        # One event per analysis item as soon as the model closes it
+        for section, text in _llm_analyzer().stream_all(case.anomalies, {}, case.hypotheses,
+                                                     case.state, "drift_analysis"):
+            yield b"data: " + fast_json.dumps({"section": section, "text": text}) + b"\n\n"
+        yield b"event: done\ndata: {}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@lru_cache(maxsize=256)
+def _rank_cached(kg_delta_key: tuple, anomalies_key: tuple) -> tuple:
+    """Rank hypotheses once per distinct (kg_delta, anomalies) input; ranking is a pure function of both."""
+    anomalies = [{"metric": metric, "effect": effect, "p": p} for metric, effect, p in anomalies_key]
+    return tuple(_hypothesis_ranker().rank_hypotheses(dict(kg_delta_key), anomalies))
+
+def _rank_hypotheses(kg_delta: Dict[str, Any], anomalies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Memoized rank_hypotheses; keys on the only anomaly fields the ranker reads."""
+    anomalies_key = tuple(
+        (anomaly["metric"], anomaly.get("effect", 0.0), anomaly.get("p", 1.0)) for anomaly in anomalies
+    )
+    ranked = _rank_cached(tuple(sorted(kg_delta.items())), anomalies_key)
+    # Cases keep and may mutate their copy
+    return [dict(hypothesis) for hypothesis in ranked]
+
 @app.post("/api/next_probe", response_model=NextProbeResponse)
-async def next_probe(request: NextProbeRequest):
+async def next_probe(request: NextProbeRequest, background_tasks: BackgroundTasks):
     """Get next probe to run for investigation."""
     start_time = time.time()
     
@@ -229,12 +366,10 @@ async def next_probe(request: NextProbeRequest):
         # Rank hypotheses if not done yet
         if not case.hypotheses:
             kg_delta = {"db_version_changed": True}  # Simplified
-            case.hypotheses = hypothesis_ranker.rank_hypotheses(
-                kg_delta, case.anomalies
-            )
+            case.hypotheses = _rank_hypotheses(kg_delta, case.anomalies)
         
         # Select next probe based on priority
-        probe_type = config.probe_priorities[case.probe_count % len(config.probe_priorities)]
+        probe_type = _PROBE_CYCLE[case.probe_count % _PROBE_N]
         
         # Create probe plan
         plan = {
@@ -253,8 +388,8 @@ async def next_probe(request: NextProbeRequest):
         
         # Log event
         duration_ms = int((time.time() - start_time) * 1000)
-        log_event(request.case_id, "next_probe", {"probe": probe_type}, 
-                 f"Planned {probe_type} probe", duration_ms)
+        background_tasks.add_task(log_event, request.case_id, "next_probe", {"probe": probe_type}, 
+                                  f"Planned {probe_type} probe", duration_ms)
         
         return NextProbeResponse(plan=plan)
         
@@ -265,7 +400,7 @@ async def next_probe(request: NextProbeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/run_probe", response_model=ProbeResult)
-async def run_probe(request: RunProbeRequest):
+async def run_probe(request: RunProbeRequest, background_tasks: BackgroundTasks):
     """Run a counterfactual probe."""
     start_time = time.time()
     
@@ -277,26 +412,26 @@ async def run_probe(request: RunProbeRequest):
         
         # Run appropriate probe
         if request.probe == "reannotate":
-            result = probes.reannotate_probe(
+            result = _probes().reannotate_probe(
                 "data/inputs/sample.vcf", "v101", "v102", request.case_id
             )
         elif request.probe == "realign_recall_locus":
-            result = probes.realign_recall_locus_probe(
+            result = _probes().realign_recall_locus_probe(
                 "data/inputs/sample_R1.fastq.gz", "data/inputs/sample_R2.fastq.gz",
                 "data/refs/grch37/chr21.fa", "data/refs/grch38/chr21.fa",
                 "data/truth/giab/giab_chr21.vcf.gz", request.case_id
             )
         elif request.probe == "downsample_noise":
-            result = probes.downsample_noise_probe(
+            result = _probes().downsample_noise_probe(
                 "data/inputs/sample.bam", "data/refs/grch37/chr21.fa", request.case_id
             )
         elif request.probe == "caller_version":
-            result = probes.caller_version_probe(
+            result = _probes().caller_version_probe(
                 "data/inputs/sample.bam", "data/refs/grch37/chr21.fa",
                 "bcftools_old", "bcftools_new", request.case_id
             )
         elif request.probe == "schema_normalize":
-            result = probes.schema_normalize_probe(
+            result = _probes().schema_normalize_probe(
                 "data/inputs/sample_annot.vcf", {"missense": "missense_variant"},
                 "models/pathogenicity_model.pkl", request.case_id
             )
@@ -306,7 +441,8 @@ async def run_probe(request: RunProbeRequest):
         # Update case state
         case.state = "ASSESS"
         case.probe_count += 1
-        case.probe_results.append(ProbeResult(**result))
+        probe_result = construct_trusted(ProbeResult, **result)
+        case.probe_results.append(probe_result)
         
         # Check convergence
         if config.is_converged(result["explains_pct"], result["p"]):
@@ -314,10 +450,10 @@ async def run_probe(request: RunProbeRequest):
         
         # Log event
         duration_ms = int((time.time() - start_time) * 1000)
-        log_event(request.case_id, "run_probe", {"probe": request.probe}, 
-                 f"Probe completed: {result['explains_pct']:.2f} explains", duration_ms)
+        background_tasks.add_task(log_event, request.case_id, "run_probe", {"probe": request.probe}, 
+                                  f"Probe completed: {result['explains_pct']:.2f} explains", duration_ms)
         
-        return ProbeResult(**result)
+        return _json_response(shallow_dict(probe_result))
         
     except Exception as e:
         duration_ms = int((time.time() - start_time) * 1000)
@@ -326,7 +462,7 @@ async def run_probe(request: RunProbeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/remediate", response_model=RemediateResponse)
-async def remediate(request: RemediateRequest):
+async def remediate(request: RemediateRequest, background_tasks: BackgroundTasks):
     """Apply remediation patch and validate."""
     start_time = time.time()
     
@@ -337,7 +473,7 @@ async def remediate(request: RemediateRequest):
         case = investigations[request.case_id]
         
         # Apply remediation
-        validation_results = remediation.apply_patch_on_microcohort(
+        validation_results = _remediation().apply_patch_on_microcohort(
             request.patch, "data/microcohort/cohort_manifest.json"
         )
         
@@ -348,8 +484,8 @@ async def remediate(request: RemediateRequest):
         
         # Log event
         duration_ms = int((time.time() - start_time) * 1000)
-        log_event(request.case_id, "remediate", {"patch": request.patch}, 
-                 f"Remediation applied: {validation_results['samples_passed']} samples passed", duration_ms)
+        background_tasks.add_task(log_event, request.case_id, "remediate", {"patch": request.patch}, 
+                                  f"Remediation applied: {validation_results['samples_passed']} samples passed", duration_ms)
         
         return RemediateResponse(
             replay_passed=validation_results["samples_passed"] > 0,
@@ -363,44 +499,67 @@ async def remediate(request: RemediateRequest):
                  f"Remediation failed: {str(e)}", duration_ms)
         raise HTTPException(status_code=500, detail=str(e))
 
+@lru_cache(maxsize=32)
+def _read_kg_cached(path: str, mtime_ns: int, size: int) -> bytes:
+    """Read a kg.json once per file version; it is already JSON, so it is served without re-parsing."""
+    with open(path, 'rb') as f:
+        return f.read()
+
 @app.get("/api/kg/{run_id}")
-async def get_kg(run_id: str):
+async def get_kg(run_id: str, if_none_match: Optional[str] = Header(None)):
     """Get knowledge graph for a run."""
     try:
         if run_id not in run_artifacts:
             raise HTTPException(status_code=404, detail="Run not found")
         
-        kg_file = run_artifacts[run_id]["kg_file"]
-        with open(kg_file, 'r') as f:
-            kg_data = json.load(f)
+        kg_file = os.path.abspath(run_artifacts[run_id]["kg_file"])
+        st = os.stat(kg_file)
+        # The graph only changes when a run rewrites the file
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
         
-        return kg_data
+        kg_data = _read_kg_cached(kg_file, st.st_mtime_ns, st.st_size)
+        return Response(content=kg_data, media_type="application/json", headers=headers)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _event_lines(case_id: str):
+    """Yield the non-empty lines of a case's events.jsonl without loading the whole file."""
+    events_file = Path("runs") / case_id / "events.jsonl"
+    _flush_event_log(case_id)
+    if not events_file.exists():
+        return
+    with open(events_file, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+def _json_array(lines):
+    """Wrap already-encoded JSON lines into one streamed JSON array."""
+    yield b"["
+    for i, line in enumerate(lines):
+        yield line if i == 0 else b"," + line
+    yield b"]"
+
 @app.get("/api/events")
 async def get_events(case_id: str):
     """Get event stream for a case."""
-    try:
-        events_file = Path("runs") / case_id / "events.jsonl"
-        
-        if not events_file.exists():
-            return []
-        
-        events = []
-        with open(events_file, 'r') as f:
-            for line in f:
-                if line.strip():
-                    events.append(json.loads(line))
-        
-        return events
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Each line is already a JSON object, so events are relayed without decoding;
+    # the (sync) generator is iterated in the threadpool
+    return StreamingResponse(_json_array(_event_lines(case_id)), media_type="application/json")
+
+@app.get("/api/events.ndjson")
+async def get_events_ndjson(case_id: str):
+    """Get event stream for a case as newline-delimited JSON."""
+    return StreamingResponse((line + b"\n" for line in _event_lines(case_id)),
+                             media_type="application/x-ndjson")
 
 @app.post("/api/summary", response_model=SummaryResponse)
-async def get_summary(request: SummaryRequest):
+async def get_summary(request: SummaryRequest, background_tasks: BackgroundTasks):
     """Get investigation summary."""
     start_time = time.time()
     
@@ -415,21 +574,21 @@ async def get_summary(request: SummaryRequest):
             "case_id": request.case_id,
             "anomalies": case.anomalies,
             "hypotheses": case.hypotheses,
-            "probe_results": [result.dict() for result in case.probe_results],
+            "probe_results": [shallow_dict(result) for result in case.probe_results],
             "remediation": case.remediation_applied,
             "validation": case.validation_results
         }
         
         # Get summary from LLM bridge
-        summary = llm_bridge.summarize_investigation(context)
+        summary = await _llm_bridge().asummarize_investigation(context)
         
         # Update state
         case.state = "SUMMARY"
         
         # Log event
         duration_ms = int((time.time() - start_time) * 1000)
-        log_event(request.case_id, "summary", {}, 
-                 f"Summary generated: {len(summary)} chars", duration_ms)
+        background_tasks.add_task(log_event, request.case_id, "summary", {}, 
+                                  f"Summary generated: {len(summary)} chars", duration_ms)
         
         return SummaryResponse(summary=summary)
         
@@ -439,23 +598,57 @@ async def get_summary(request: SummaryRequest):
                  f"Summary failed: {str(e)}", duration_ms)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _args_hash(args: Dict[str, Any]) -> str:
+    """Short fingerprint of event args (32 bits, hex), comparable across deployments."""
+    # One fixed serialization and algorithm; fast_json output depends on which backend is installed
+    payload = json.dumps(args, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=4).hexdigest()
+
+# Open append handles for each case's events.jsonl; the oldest is closed past the cap
+_MAX_EVENT_LOGS = 256
+_event_logs: Dict[str, Any] = {}
+_event_logs_lock = threading.Lock()
+
+def _flush_event_log(case_id: str):
+    """Flush buffered events for a case so readers see them."""
+    with _event_logs_lock:
+        handle = _event_logs.get(case_id)
+        if handle is not None:
+            handle.flush()
+
+@app.on_event("shutdown")
+def _close_event_logs():
+    """Flush and close all open event log handles."""
+    with _event_logs_lock:
+        for handle in _event_logs.values():
+            handle.close()
+        _event_logs.clear()
+
+atexit.register(_close_event_logs)
+
 def log_event(case_id: str, action: str, args: Dict[str, Any], 
               result_summary: str, duration_ms: int):
     """Log an event to the events.jsonl file."""
     try:
-        events_file = Path("runs") / case_id / "events.jsonl"
-        events_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        event = EventLog(
-            timestamp=datetime.now(),
-            action=action,
-            args_hash=hashlib.md5(json.dumps(args, sort_keys=True).encode()).hexdigest()[:8],
-            result_summary=result_summary,
-            duration_ms=duration_ms
-        )
-        
-        with open(events_file, 'a') as f:
-            f.write(event.json() + "\n")
+        # Same fields and order as the EventLog schema, encoded without a model round trip
+        event = {
+            "timestamp": datetime.now().isoformat(),
+            "action": action,
+            "args_hash": _args_hash(args),
+            "result_summary": result_summary,
+            "duration_ms": duration_ms
+        }
+        line = fast_json.dumps(event) + b"\n"
+        
+        with _event_logs_lock:
+            handle = _event_logs.get(case_id)
+            if handle is None:
+                if len(_event_logs) >= _MAX_EVENT_LOGS:
+                    _event_logs.pop(next(iter(_event_logs))).close()
+                events_file = Path("runs") / case_id / "events.jsonl"
+                events_file.parent.mkdir(parents=True, exist_ok=True)
+                handle = _event_logs[case_id] = open(events_file, 'ab', buffering=64 * 1024)
+            handle.write(line)
             
     except Exception as e:
         print(f"Failed to log event: {e}")
@@ -6,6 +6,15 @@ from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
+def construct_trusted(model: type, **fields: Any) -> BaseModel:
+    """Build a model from data our own code produced, skipping validation (pydantic v1 or v2)."""
+    construct = getattr(model, "model_construct", None) or model.construct
+    return construct(**fields)
+
+def shallow_dict(model: BaseModel) -> Dict[str, Any]:
+    """Field values of a model, without the recursive copy .dict() makes."""
+    return dict(model.__dict__)
+
 class RunRequest(BaseModel):
     """Request model for pipeline run."""
     sample_id: str
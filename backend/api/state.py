@@ -0,0 +1,63 @@
+"""
+Bounded, snapshot-backed storage for API state.
+Keeps the most recently used entries in memory and persists them as JSON snapshots.
+"""
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from analysis import fast_json
+
+class LRUStore(OrderedDict):
+    """Dict that evicts its least recently used entry beyond maxsize."""
+
+    def __init__(self, maxsize: int = 1024):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+class SnapshotWriter:
+    """Writes a store to a JSON file, skipping writes when nothing changed since the last one."""
+
+    def __init__(self, path: Path, encode: Callable[[Any], Any] = None):
+        self.path = Path(path)
+        self.encode = encode
+        self._last: Optional[bytes] = None
+
+    def serialize(self, store: Dict[str, Any]) -> Optional[bytes]:
+        """Encode the store, or return None if it matches the last written snapshot."""
+        data = fast_json.dumps({
+            key: self.encode(value) if self.encode else value for key, value in store.items()
+        })
+        return None if data == self._last else data
+
+    def write(self, data: bytes):
+        """Atomically replace the snapshot file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        self._last = data
+
+    def load(self, store: LRUStore, decode: Callable[[Any], Any] = None):
+        """Rehydrate a store from the snapshot file, if present."""
+        if not self.path.exists():
+            return
+        try:
+            entries = fast_json.load(self.path)
+        except ValueError as e:
+            print(f"⚠ Ignoring unreadable state snapshot {self.path}: {e}")
+            return
+        for key, value in entries.items():
+            store[key] = decode(value) if decode else value
@@ -7,6 +7,7 @@ import os
 sys.path.append('.')
 
 from analysis.detectors import DriftDetector
+from fixtures import baseline, drifted
 
 def debug_detector():
     """Debug the drift detector."""
@@ -16,26 +17,19 @@ def debug_detector():
     
     # Create some baseline metrics first
     print("\n1. Creating baseline metrics...")
-    baseline_metrics = {
-        "clinvar_counts": {"pathogenic": 20, "benign": 80, "vus": 200},
-        "consequence_hist": {"missense": 0.4, "synonymous": 0.3, "nonsense": 0.1},
-        "transcript_policy_counts": {"canonical": 0.7, "all": 0.3}
-    }
+    baseline_metrics = baseline()
     
     detector.store_metrics("baseline_run", "annotate", baseline_metrics)
     print("✓ Baseline metrics stored")
     
     # Check what baseline data we have
-    baseline = detector.get_baseline_metrics("annotate")
-    print(f"Baseline data: {baseline}")
+    stored_baseline = detector.get_baseline_metrics("annotate")
+    print(f"Baseline data: {stored_baseline}")
     
     # Create drifted metrics (simulating DB version change)
     print("\n2. Creating drifted metrics...")
-    drifted_metrics = {
-        "clinvar_counts": {"pathogenic": 35, "benign": 65, "vus": 200},  # More pathogenic
-        "consequence_hist": {"missense": 0.5, "synonymous": 0.2, "nonsense": 0.1},  # More missense
-        "transcript_policy_counts": {"canonical": 0.6, "all": 0.4}  # More non-canonical
-    }
+    drifted_metrics = drifted()
+    drifted_metrics["clinvar_counts"].update(pathogenic=35, benign=65)  # More pathogenic, under the 15% heuristic
     
     # Test the annotation drift detection directly
     print("\n3. Testing annotation drift detection directly...")
@@ -5,6 +5,8 @@ Debug simple drift detection.
 import sys
 import os
 sys.path.append('.')
+import numpy as np
+from analysis.metrics import check_pathogenic_drift, PATHOGENIC_DRIFT_THRESHOLD
 
 def debug_simple():
     """Debug simple drift detection."""
@@ -24,11 +26,16 @@ def debug_simple():
     print(f"Current counts: {current_counts}")
     
     if current_counts:
-        pathogenic_pct = current_counts.get("pathogenic", 0) / max(sum(current_counts.values()), 1)
+        # A 1 x K count matrix; monitors score N runs at once with the same call
+        labels = ["pathogenic"] + [k for k in current_counts if k != "pathogenic"]
+        current_counts = {"pathogenic": 0, **current_counts}
+        counts = np.array([[current_counts[k] for k in labels]])
+        pathogenic_pct = counts[0, 0] / max(counts.sum(), 1)
+        drifted = bool(check_pathogenic_drift(counts, path_idx=0)[0])
         print(f"Pathogenic percentage: {pathogenic_pct}")
-        print(f"Threshold check: {pathogenic_pct} > 0.15 = {pathogenic_pct > 0.15}")
+        print(f"Threshold check: {pathogenic_pct} > {PATHOGENIC_DRIFT_THRESHOLD} = {drifted}")
         
-        if pathogenic_pct > 0.15:  # More than 15% pathogenic
+        if drifted:  # More than 15% pathogenic
             print("✓ Would detect drift!")
         else:
             print("✗ Would not detect drift")
@@ -0,0 +1,36 @@
+"""
+Shared annotation-stage metric fixtures for the test and debug scripts.
+Canonical values are read-only; callers get fresh dicts they may mutate.
+"""
+from types import MappingProxyType
+from typing import Dict, Any
+
+def _frozen(metrics: Dict[str, Dict[str, float]]) -> MappingProxyType:
+    """Read-only view of a two-level metrics dict."""
+    return MappingProxyType({name: MappingProxyType(hist) for name, hist in metrics.items()})
+
+# Annotation metrics of a clean v101 run
+BASELINE_METRICS = _frozen({
+    "clinvar_counts": {"pathogenic": 20, "benign": 80, "vus": 200},
+    "consequence_hist": {"missense": 0.4, "synonymous": 0.3, "nonsense": 0.1},
+    "transcript_policy_counts": {"canonical": 0.7, "all": 0.3}
+})
+
+# Annotation metrics after the v102 DB change; 50/300 pathogenic crosses the 15% heuristic
+DRIFTED_METRICS = _frozen({
+    "clinvar_counts": {"pathogenic": 50, "benign": 50, "vus": 200},  # 25% pathogenic
+    "consequence_hist": {"missense": 0.5, "synonymous": 0.2, "nonsense": 0.1},  # More missense
+    "transcript_policy_counts": {"canonical": 0.6, "all": 0.4}  # More non-canonical
+})
+
+def _thaw(metrics: MappingProxyType) -> Dict[str, Any]:
+    """Fresh plain-dict copy; the values are flat, so one level of dict() is a full copy."""
+    return {name: dict(hist) for name, hist in metrics.items()}
+
+def baseline() -> Dict[str, Any]:
+    """Mutable copy of BASELINE_METRICS."""
+    return _thaw(BASELINE_METRICS)
+
+def drifted() -> Dict[str, Any]:
+    """Mutable copy of DRIFTED_METRICS."""
+    return _thaw(DRIFTED_METRICS)
@@ -2,96 +2,155 @@
 """
 Simple annotation script to replace VEP for testing.
 """
+import os
+import re
 import sys
 import gzip
-import random
+import mmap
+from contextlib import nullcontext
+import numpy as np
+
+# Optional ISA-L import for faster gzip output
+try:
+    from isal import igzip
+    ISAL_AVAILABLE = True
+except ImportError:
+    ISAL_AVAILABLE = False
+
+CLNSIG_RE = re.compile(rb'CLNSIG=([^;]*)')
+CSQ_HEADER = b'##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence annotations">\n'
+CONSEQUENCES = (b'missense_variant', b'synonymous_variant', b'intron_variant')
+
+# Label codes, indexed into CLINVAR_LABELS
+PATHOGENIC, BENIGN, VUS = 0, 1, 2
+CLINVAR_LABELS = (b'pathogenic', b'benign', b'VUS')
+
+# Existing CLNSIG classes; the lookaheads report both terms in one match
+CLNSIG_CLASS_RE = re.compile(rb'(?=.*?(pathogenic))?(?=.*?(benign))?')
+CLASS_PATHOGENIC, CLASS_BENIGN, CLASS_OTHER, CLASS_NONE = 0, 1, 2, 3
+# Class indexed by (has 'pathogenic') << 1 | (has 'benign')
+CLASS_BY_MASK = (CLASS_OTHER, CLASS_BENIGN, CLASS_PATHOGENIC, CLASS_PATHOGENIC)
+
+# Label per CLNSIG class; -1 entries are drawn at random instead
+V101_LABELS = np.array([PATHOGENIC, BENIGN, VUS, -1], dtype=np.int8)
+V102_LABELS = np.array([PATHOGENIC, -1, VUS, -1], dtype=np.int8)
+
+# Output is rewritten on every run, so favour deflate speed over ratio
+GZIP_LEVEL = 1
+
+def _open_output(path):
+    """Open the output VCF for binary writing, gzip-compressed when it ends in .gz."""
+    if not path.endswith('.gz'):
+        return open(path, 'wb', buffering=1 << 20)
+    if ISAL_AVAILABLE:
+        return igzip.open(path, 'wb', compresslevel=GZIP_LEVEL)
+    return gzip.open(path, 'wb', compresslevel=GZIP_LEVEL)
+
+def _read_buffer(path):
+    """Map a plain VCF read-only, or read a gzipped one into memory; use as a context manager."""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            return nullcontext(f.read())
+    with open(path, 'rb') as f:
+        # mmap can't map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return nullcontext(b'')
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _header_end(buf):
+    """Offset just past the leading block of '#' header lines."""
+    pos = 0
+    while buf[pos:pos + 1] == b'#':
+        nl = buf.find(b'\n', pos)
+        if nl < 0:
+            return len(buf)
+        pos = nl + 1
+    return pos
+
+def _with_csq_header(header):
+    """Header block split around the CSQ INFO line, which goes just before the first ##INFO line."""
+    if header.startswith(b'##INFO'):
+        first_info = 0
+    else:
+        first_info = header.find(b'\n##INFO') + 1
+        if first_info == 0:
+            # No INFO definitions to sit beside; the header is copied as-is
+            return [header]
+    return [header[:first_info], CSQ_HEADER, header[first_info:]]
+
+def _draw_annotations(n, rng):
+    """Draw every per-record random choice up front, one array per choice."""
+    return {
+        "consequence": rng.integers(0, len(CONSEQUENCES), size=n),
+        "clinvar": rng.integers(0, len(CLINVAR_LABELS), size=n),  # v101 label without CLNSIG
+        "benign_or_vus": rng.choice(np.array([BENIGN, VUS], dtype=np.int8), size=n),  # v102 fallback
+        "reclassify": rng.random(n) < 0.5,  # v102 benign -> pathogenic
+        "force_pathogenic": rng.random(n) < 0.4  # v102 pathogenic without CLNSIG
+    }
+
+def _clnsig_class(clnsig):
+    """Classify one CLNSIG value with a single regex match; a 'pathogenic' anywhere wins over 'benign'."""
+    if not clnsig:
+        return CLASS_NONE
+    m = CLNSIG_CLASS_RE.match(clnsig)
+    # 'likely_pathogenic' contains 'pathogenic', so one group covers both
+    return CLASS_BY_MASK[(m.group(1) is not None) << 1 | (m.group(2) is not None)]
+
+def _clinvar_labels(clnsigs, db_version, draws):
+    """Assign a ClinVar label code to every record at once from its existing CLNSIG (or None)."""
+    classes = np.fromiter(map(_clnsig_class, clnsigs), dtype=np.int8, count=len(clnsigs))
+    no_clnsig = classes == CLASS_NONE
+    
+    if db_version == 'v101':
+        # Simulate v101 annotations: existing CLNSIG converted, otherwise uniform
+        labels = V101_LABELS[classes]
+        labels[no_clnsig] = draws["clinvar"][no_clnsig]
+    else:  # v102
+        # Simulate v102 annotations (more pathogenic)
+        labels = V102_LABELS[classes]
+        benign = classes == CLASS_BENIGN
+        labels[benign] = np.where(draws["reclassify"][benign], PATHOGENIC, BENIGN)
+        labels[no_clnsig] = np.where(draws["force_pathogenic"][no_clnsig], PATHOGENIC,
+                                     draws["benign_or_vus"][no_clnsig])
+    return labels
 
 def annotate_vcf(input_vcf, output_vcf, db_version):
     """Simple VCF annotation that adds functional predictions."""
     
-    # Set seed for deterministic results
-    random.seed(42)
+    # Seeded generator for deterministic results
+    rng = np.random.default_rng(42)
     
-    # Read input VCF
-    if input_vcf.endswith('.gz'):
-        infile = gzip.open(input_vcf, 'rt')
-    else:
-        infile = open(input_vcf, 'r')
+    # One split over the body; header and comment lines pass through untouched
+    with _read_buffer(input_vcf) as buf:
+        pos = _header_end(buf)
+        header = b''.join(_with_csq_header(buf[:pos]))
+        lines = buf[pos:].split(b'\n')
     
-    # Write output VCF
-    if output_vcf.endswith('.gz'):
-        outfile = gzip.open(output_vcf, 'wt')
-    else:
-        outfile = open(output_vcf, 'w')
+    # Capped split stops after the INFO column (8th field); the rest of the record stays as one piece
+    records = []
+    for i, line in enumerate(lines):
+        if line[:1] != b'#':
+            fields = line.strip().split(b'\t', 8)
+            if len(fields) > 7:
+                records.append((i, fields))
     
-    # Process VCF
-    for line in infile:
-        if line.startswith('#'):
-            # Header line
-            if line.startswith('##INFO'):
-                # Add annotation fields
-                outfile.write('##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence annotations">\n')
-            outfile.write(line)
-        else:
-            # Variant line
-            fields = line.strip().split('\t')
-            if len(fields) >= 8:
-                # Parse existing CLNSIG field and add CSQ annotation
-                info_field = fields[7]
-                
-                # Extract existing CLNSIG if present
-                existing_clnsig = None
-                if 'CLNSIG=' in info_field:
-                    clnsig_part = info_field.split('CLNSIG=')[1].split(';')[0]
-                    existing_clnsig = clnsig_part
-                
-                if db_version == 'v101':
-                    # Simulate v101 annotations
-                    consequence = random.choice(['missense_variant', 'synonymous_variant', 'intron_variant'])
-                    if existing_clnsig:
-                        # Use existing CLNSIG but convert to our format
-                        if 'pathogenic' in existing_clnsig:
-                            clinvar = 'pathogenic'
-                        elif 'benign' in existing_clnsig:
-                            clinvar = 'benign'
-                        else:
-                            clinvar = 'VUS'
-                    else:
-                        clinvar = random.choice(['pathogenic', 'benign', 'VUS'])
-                else:  # v102
-                    # Simulate v102 annotations (more pathogenic)
-                    consequence = random.choice(['missense_variant', 'synonymous_variant', 'intron_variant'])
-                    if existing_clnsig:
-                        # In v102, be more aggressive about pathogenic classification
-                        if 'pathogenic' in existing_clnsig or 'likely_pathogenic' in existing_clnsig:
-                            clinvar = 'pathogenic'
-                        elif 'benign' in existing_clnsig:
-                            # 50% chance of reclassifying benign as pathogenic in v102
-                            if random.random() < 0.5:
-                                clinvar = 'pathogenic'
-                            else:
-                                clinvar = 'benign'
-                        else:
-                            clinvar = 'VUS'
-                    else:
-                        if random.random() < 0.4:  # 40% chance of pathogenic in v102
-                            clinvar = 'pathogenic'
-                        else:
-                            clinvar = random.choice(['benign', 'VUS'])
-                
-                # Add CSQ annotation to INFO field
-                if info_field == '.':
-                    info_field = f'CSQ={consequence}|{clinvar}'
-                else:
-                    info_field += f';CSQ={consequence}|{clinvar}'
-                
-                fields[7] = info_field
-                outfile.write('\t'.join(fields) + '\n')
-            else:
-                outfile.write(line)
+    # Extract existing CLNSIG if present, then draw every record's annotation at once
+    clnsigs = [m.group(1) if (m := CLNSIG_RE.search(fields[7])) else None for _, fields in records]
+    draws = _draw_annotations(len(records), rng)
+    consequences = draws["consequence"].tolist()
+    labels = _clinvar_labels(clnsigs, db_version, draws).tolist()
     
-    infile.close()
-    outfile.close()
+    for (i, fields), c, label in zip(records, consequences, labels):
+        # Add CSQ annotation to INFO field
+        annotation = b'CSQ=' + CONSEQUENCES[c] + b'|' + CLINVAR_LABELS[label]
+        if fields[7] != b'.':
+            annotation = fields[7] + b';' + annotation
+        fields[7] = annotation
+        lines[i] = b'\t'.join(fields)
+    
+    # Write output VCF
+    with _open_output(output_vcf) as outfile:
+        outfile.write(header + b'\n'.join(lines))
 
 if __name__ == '__main__':
     if len(sys.argv) != 4:
@@ -4,20 +4,40 @@ Verify data fixtures and print status table.
 """
 import os
 import hashlib
-from pathlib import Path
+
+# Digests by (abspath, mtime_ns, size), so an unchanged file is only read once per process
+_HASH_CACHE = {}
+
+def _digest(f):
+    """SHA256 prefix of an open binary file, streamed in fixed-size buffers."""
+    if hasattr(hashlib, "file_digest"):
+        return hashlib.file_digest(f, "sha256").hexdigest()[:8]
+    
+    # Python < 3.11
+    h = hashlib.sha256()
+    while chunk := f.read(1 << 20):
+        h.update(chunk)
+    return h.hexdigest()[:8]
+
+def _fingerprint(filepath):
+    """(size, hash, exists) for a path from a single open() and fstat()."""
+    try:
+        with open(filepath, 'rb') as f:
+            st = os.fstat(f.fileno())
+            key = (os.path.abspath(filepath), st.st_mtime_ns, st.st_size)
+            if key not in _HASH_CACHE:
+                _HASH_CACHE[key] = _digest(f)
+            return st.st_size, _HASH_CACHE[key], True
+    except FileNotFoundError:
+        return 0, "N/A", False
 
 def get_file_hash(filepath):
     """Get SHA256 hash of file."""
-    if not os.path.exists(filepath):
-        return "N/A"
-    with open(filepath, 'rb') as f:
-        return hashlib.sha256(f.read()).hexdigest()[:8]
+    return _fingerprint(filepath)[1]
 
 def get_file_size(filepath):
     """Get file size in bytes."""
-    if not os.path.exists(filepath):
-        return 0
-    return os.path.getsize(filepath)
+    return _fingerprint(filepath)[0]
 
 def main():
     print("GIA Data Verification")
@@ -35,23 +55,23 @@ def main():
         "data/truth/giab/giab_chr21.vcf.gz"
     ]
     
-    print(f"{'Path':<40} {'Size':<10} {'Hash':<10} {'Status'}")
-    print("-" * 70)
-    
-    simulated_mode = False
+    rows = [f"{'Path':<40} {'Size':<10} {'Hash':<10} {'Status'}", "-" * 70]
+    missing = []
     for path in paths:
-        size = get_file_size(path)
-        hash_val = get_file_hash(path)
-        if os.path.exists(path):
-            status = "OK (real)"
-        else:
-            status = "SIMULATED"
-            simulated_mode = True
-            # Create placeholder file
-            Path(path).parent.mkdir(parents=True, exist_ok=True)
-            Path(path).touch()
-        
-        print(f"{path:<40} {size:<10} {hash_val:<10} {status}")
+        # One open per path, shared by the size, hash and existence checks
+        size, hash_val, exists = _fingerprint(path)
+        rows.append(f"{path:<40} {size:<10} {hash_val:<10} {'OK (real)' if exists else 'SIMULATED'}")
+        if not exists:
+            missing.append(path)
+    
+    # Create placeholder files: one mkdir per distinct parent, one create per file
+    for parent in {os.path.dirname(path) for path in missing}:
+        os.makedirs(parent, exist_ok=True)
+    for path in missing:
+        open(path, 'ab').close()
+    
+    print("\n".join(rows))
+    simulated_mode = bool(missing)
     
     if simulated_mode:
         print("\n⚠ SIMULATED MODE ENABLED - Some data files are placeholders")
@@ -3,10 +3,19 @@
 Test FastAPI endpoints to verify they work correctly.
 """
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 import sys
 
+# One keep-alive connection pool for every request in the test
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+
+# (connect, read) timeouts; /api/run runs the whole pipeline
+RUN_TIMEOUT = (1, 600)
+API_TIMEOUT = (1, 60)
+
 def test_api_endpoints():
     """Test all API endpoints."""
     base_url = "http://localhost:8000"
@@ -16,12 +25,12 @@ def test_api_endpoints():
     # Test 1: Run pipeline
     print("\n1. Testing /api/run endpoint...")
     try:
-        run_response = requests.post(f"{base_url}/api/run", json={
+        run_response = SESSION.post(f"{base_url}/api/run", json={
             "sample_id": "test_sample",
             "fq1_path": "data/inputs/sample_001_R1.fastq.gz",
             "fq2_path": "data/inputs/sample_001_R2.fastq.gz",
             "reference": "data/refs/grch37/chr21.fa"
-        })
+        }, timeout=RUN_TIMEOUT)
         
         if run_response.status_code == 200:
             run_data = run_response.json()
@@ -38,10 +47,10 @@ def test_api_endpoints():
     # Test 2: Check drift
     print("\n2. Testing /api/check_drift endpoint...")
     try:
-        drift_response = requests.post(f"{base_url}/api/check_drift", json={
+        drift_response = SESSION.post(f"{base_url}/api/check_drift", json={
             "run_id": run_id,
             "baseline": "rolling"
-        })
+        }, timeout=API_TIMEOUT)
         
         if drift_response.status_code == 200:
             drift_data = drift_response.json()
@@ -59,9 +68,9 @@ def test_api_endpoints():
     if case_id:
         print(f"\n3. Testing /api/next_probe endpoint...")
         try:
-            probe_response = requests.post(f"{base_url}/api/next_probe", json={
+            probe_response = SESSION.post(f"{base_url}/api/next_probe", json={
                 "case_id": case_id
-            })
+            }, timeout=API_TIMEOUT)
             
             if probe_response.status_code == 200:
                 probe_data = probe_response.json()
@@ -8,6 +8,7 @@ sys.path.append('.')
 
 from analysis.detectors import DriftDetector
 from analysis.pipeline import annotate
+from fixtures import baseline, drifted
 import tempfile
 
 def test_drift_detection():
@@ -18,26 +19,19 @@ def test_drift_detection():
     
     # Create some baseline metrics first
     print("\n1. Creating baseline metrics...")
-    baseline_metrics = {
-        "clinvar_counts": {"pathogenic": 20, "benign": 80, "vus": 200},
-        "consequence_hist": {"missense": 0.4, "synonymous": 0.3, "nonsense": 0.1},
-        "transcript_policy_counts": {"canonical": 0.7, "all": 0.3}
-    }
+    baseline_metrics = baseline()
     
     detector.store_metrics("baseline_run", "annotate", baseline_metrics)
     print("✓ Baseline metrics stored")
     
     # Create drifted metrics (simulating DB version change)
     print("\n2. Creating drifted metrics...")
-    drifted_metrics = {
-        "clinvar_counts": {"pathogenic": 50, "benign": 50, "vus": 200},  # 25% pathogenic
-        "consequence_hist": {"missense": 0.5, "synonymous": 0.2, "nonsense": 0.1},  # More missense
-        "transcript_policy_counts": {"canonical": 0.6, "all": 0.4}  # More non-canonical
-    }
+    drifted_metrics = drifted()  # 25% pathogenic
     
     # Detect drift
     print("\n3. Detecting drift...")
     anomalies = detector.detect_drift("drifted_run", "annotate", drifted_metrics)
+    detector.close()
     print(f"✓ Found {len(anomalies)} anomalies")
     
     for anomaly in anomalies:
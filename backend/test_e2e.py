@@ -7,6 +7,8 @@ import sys
 import os
 import time
 import json
+import hashlib
+from pathlib import Path
 sys.path.append('.')
 
 from analysis.pipeline import align, call_variants, annotate, predict
@@ -15,6 +17,71 @@ from analysis.hypotheses import HypothesisRanker
 from analysis.probes import CounterfactualProbes
 from analysis.report import RemediationEngine
 from analysis.llm_bridge import LLMBridge
+from fixtures import drifted
+
+# With GIA_REUSE_BASELINE=1, baseline outputs are reused across runs while the inputs,
+# the pipeline code and the artifacts are unchanged; by default the real pipeline runs
+BASELINE_DIR = "runs/baseline"
+BASELINE_FIXTURE = Path(BASELINE_DIR) / ".fixtures.json"
+BASELINE_INPUTS = (
+    "data/inputs/sample_001_R1.fastq.gz",
+    "data/inputs/sample_001_R2.fastq.gz",
+    "data/refs/grch37/chr21.fa"
+)
+BASELINE_CODE = (
+    "analysis/pipeline.py",
+    "scripts/simple_annotate.py"
+)
+
+def _inputs_fingerprint():
+    """(path, size, mtime_ns) of each baseline input, None fields for missing files, then (path, sha1) of the pipeline code."""
+    fingerprint = []
+    for path in BASELINE_INPUTS:
+        try:
+            st = os.stat(path)
+            fingerprint.append([path, st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            fingerprint.append([path, None, None])
+    # Code is keyed by content, so a checkout or edit that keeps mtimes still reruns the stages
+    for path in BASELINE_CODE:
+        with open(path, 'rb') as f:
+            fingerprint.append([path, hashlib.sha1(f.read()).hexdigest()])
+    return fingerprint
+
+def run_baseline_pipeline():
+    """Run align, call and v101 annotate, or with GIA_REUSE_BASELINE=1 reuse the outputs of an identical earlier run."""
+    fingerprint = _inputs_fingerprint()
+    if os.getenv("GIA_REUSE_BASELINE") == "1" and BASELINE_FIXTURE.exists():
+        with open(BASELINE_FIXTURE) as f:
+            fixture = json.load(f)
+        artifacts = (fixture["bam"], fixture["vcf"], fixture["annot_vcf"])
+        if fixture["inputs"] == fingerprint and all(os.path.exists(p) for p in artifacts):
+            print("  (reusing cached baseline outputs)")
+            return artifacts + (fixture["annot_metrics"], False)
+    
+    bam_path, align_metrics = align(*BASELINE_INPUTS, BASELINE_DIR)
+    vcf_path, call_metrics = call_variants(
+        bam_path, "data/refs/grch37/chr21.fa", "bcftools", BASELINE_DIR,
+        simulated=align_metrics.get("simulated", False)
+    )
+    vcf_simulated = call_metrics.get("simulated", False)
+    # Baseline annotation with v101
+    annot_vcf, annot_metrics = annotate(
+        vcf_path, "vep", "v101", "canonical", BASELINE_DIR, simulated=vcf_simulated
+    )
+    
+    # Placeholder outputs are never written, so the exists() check above skips reusing a simulated run;
+    # a reused baseline is always real, hence vcf_simulated=False on that path
+    BASELINE_FIXTURE.parent.mkdir(parents=True, exist_ok=True)
+    with open(BASELINE_FIXTURE, 'w') as f:
+        json.dump({
+            "inputs": fingerprint,
+            "bam": bam_path,
+            "vcf": vcf_path,
+            "annot_vcf": annot_vcf,
+            "annot_metrics": annot_metrics
+        }, f)
+    return bam_path, vcf_path, annot_vcf, annot_metrics, vcf_simulated
 
 def test_e2e_annotation_drift():
     """Test the complete annotation drift scenario."""
@@ -24,21 +91,7 @@ def test_e2e_annotation_drift():
     # Step 1: Run pipeline with baseline (v101)
     print("\n1. Running baseline pipeline (v101)...")
     try:
-        bam_path, align_metrics = align(
-            "data/inputs/sample_001_R1.fastq.gz",
-            "data/inputs/sample_001_R2.fastq.gz",
-            "data/refs/grch37/chr21.fa",
-            "runs/baseline"
-        )
-        
-        vcf_path, call_metrics = call_variants(
-            bam_path, "data/refs/grch37/chr21.fa", "bcftools", "runs/baseline"
-        )
-        
-        # Baseline annotation with v101
-        annot_vcf_v101, annot_metrics_v101 = annotate(
-            vcf_path, "vep", "v101", "canonical", "runs/baseline"
-        )
+        bam_path, vcf_path, annot_vcf_v101, annot_metrics_v101, vcf_simulated = run_baseline_pipeline()
         
         print(f"✓ Baseline pipeline completed")
         print(f"  - BAM: {bam_path}")
@@ -54,7 +107,7 @@ def test_e2e_annotation_drift():
     try:
         # Drifted annotation with v102 (simulating DB update)
         annot_vcf_v102, annot_metrics_v102 = annotate(
-            vcf_path, "vep", "v102", "canonical", "runs/drifted"
+            vcf_path, "vep", "v102", "canonical", "runs/drifted", simulated=vcf_simulated
         )
         
         print(f"✓ Drifted pipeline completed")
@@ -70,11 +123,7 @@ def test_e2e_annotation_drift():
         detector = DriftDetector()
         
         # Create drifted metrics that will trigger detection
-        drifted_metrics = {
-            "clinvar_counts": {"pathogenic": 50, "benign": 50, "vus": 200},  # 25% pathogenic
-            "consequence_hist": {"missense": 0.5, "synonymous": 0.2, "nonsense": 0.1},
-            "transcript_policy_counts": {"canonical": 0.6, "all": 0.4}
-        }
+        drifted_metrics = drifted()  # 25% pathogenic
         
         # Detect drift in drifted metrics
         anomalies = detector.detect_drift("drifted_run", "annotate", drifted_metrics)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Test distribution metrics end to end on small deterministic samples.
+"""
+import sys
+import os
+sys.path.append('.')
+
+from analysis.metrics import psi, js_divergence, compute_all_metrics
+
+def test_distribution_metrics():
+    """Call psi, js_divergence and compute_all_metrics on identical and shifted samples."""
+    print("Testing distribution metrics...")
+    
+    baseline = [i / 100 for i in range(100)]
+    shifted = [0.5 + i / 200 for i in range(100)]
+    
+    try:
+        # Identical samples have no divergence; a shifted one does
+        print("\n1. Testing psi and js_divergence...")
+        assert psi(baseline, baseline) == 0.0, "psi of identical samples should be 0"
+        assert js_divergence(baseline, baseline) == 0.0, "JS of identical samples should be 0"
+        assert psi(shifted, baseline) > 0.1, "psi should flag a shifted sample"
+        assert js_divergence(shifted, baseline) > 0.1, "JS should flag a shifted sample"
+        
+        # Degenerate inputs return 0 rather than raising
+        assert psi([], baseline) == 0.0
+        assert js_divergence([1.0, 1.0], [1.0]) == 0.0
+        print("✓ psi and js_divergence OK")
+        
+        print("\n2. Testing compute_all_metrics...")
+        results = compute_all_metrics(shifted, baseline, y_true=[0, 1, 1, 0], y_pred=[0.1, 0.9, 0.8, 0.3])
+        for key in ("ks", "psi", "js_divergence", "median_iqr", "ece", "brier"):
+            assert key in results, f"Missing key: {key}"
+        assert results["psi"] == psi(shifted, baseline)
+        assert results["js_divergence"] == js_divergence(shifted, baseline)
+        print(f"✓ compute_all_metrics returned: {sorted(results)}")
+    
+    except Exception as e:
+        print(f"✗ metrics failed: {e}")
+        return False
+    
+    return True
+
+if __name__ == "__main__":
+    success = test_distribution_metrics()
+    if success:
+        print("\n🎉 Metrics test PASSED")
+        exit(0)
+    else:
+        print("\n❌ Metrics test FAILED")
+        exit(1)
@@ -47,7 +47,8 @@ def test_pipeline_functions():
                 bam_path,
                 "data/refs/grch37/chr21.fa",
                 "bcftools",
-                temp_dir
+                temp_dir,
+                simulated=align_metrics.get("simulated", False)
             )
             print(f"✓ call_variants returned: {vcf_path}")
             print(f"✓ call_variants metrics keys: {list(call_metrics.keys())}")
@@ -70,7 +71,8 @@ def test_pipeline_functions():
                 "vep",
                 "v101",
                 "canonical",
-                temp_dir
+                temp_dir,
+                simulated=call_metrics.get("simulated", False)
             )
             print(f"✓ annotate returned: {annot_vcf_path}")
             print(f"✓ annotate metrics keys: {list(annot_metrics.keys())}")